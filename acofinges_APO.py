@@ -8,22 +8,29 @@ from finanzas import *
 # LECTURA DE DATOS
 #Leemos los datos de los archivos correspondientes a las cuentas de : APORTACIONES:    'acofingesAPO.csv'
 # (1) Se define ruta; (2) Se lee archivo CSV; y (3) Se limita a las columnas 'Fecha', 'Depósito' y 'Saldo'
+# PREPARACION DE DATOS: al leer se convierten 'Depósito' y 'Saldo' con errors="coerce" (valores inválidos a 0).
+# El resultado se guarda en acofingesAPO.csv.parquet y se reutiliza mientras el CSV no cambie.
 
 main_dir              = '/home/carlos/workbenchPython/finanzas/datos/'
-ap                    = pd.read_csv(main_dir+'acofingesAPO.csv', parse_dates=['Fecha'], dayfirst=True, decimal=".", thousands=',')
+ap                    = leer_csv_cacheado(main_dir+'acofingesAPO.csv', fechas=['Fecha'], numericas=['Depósito', 'Saldo'])
 ap                    = ap[['Fecha', 'Depósito', 'Saldo']]
 
-# PREPARACION DE DATOS
-# Convertir con manejo de errores, errors="coerce" convierte valores inválidos en NaN, evitando fallos.
-ap['Depósito']        = pd.to_numeric(ap['Depósito'], errors='coerce').fillna(0)  # Convierte, pone NaN en errores
-ap['Saldo']           = pd.to_numeric(ap['Saldo'], errors='coerce').fillna(0)
+# LIBRO DE LA CUENTA
+# Los totales anuales y mensuales se guardan en un libro persistente junto al CSV. En cada ejecución solo se procesan
+# los movimientos que aún no están en el libro (también los nuevos del mismo día que el último registrado) y se
+# actualizan los meses y años afectados.
+# Si se corrigen movimientos ya procesados basta con borrar el archivo del libro para recalcularlo todo.
+ruta_libro            = main_dir+'acofingesAPO.libro.pkl'
+libro                 = LibroFondo.cargar(ruta_libro)
+libro.agregar(ap)
+libro.guardar(ruta_libro)
 
 
 # ***PARTE I***
 
 #Depositos y SaldosANUALes
-anual_deposito       = ap.groupby(ap['Fecha'].dt.year).sum()['Depósito']
-anual_saldo          = ap.groupby(ap['Fecha'].dt.year).last()['Saldo']
+anual_deposito       = libro.deposito_anual
+anual_saldo          = libro.saldo_anual
 
 # Para cada caso, los totales se calculan de manera diferente. En la Series 'Depósito' se suman los depositos anuales. Para 
 # la Series 'Saldo' se toma en cuenta que: se tiene una Series, no un DataFrame. Si anual_saldo fuera un DataFrame, necesitaríamos dos índices (iloc[fila, columna]). Pero al ser una Series, solo necesita un índice (iloc[fila]).
@@ -46,17 +53,11 @@ plot_barras(anual_saldo, apilado=True, rotulos=['Year','Saldo [US$]',titulo_sald
 # Es decir, el interés compuesto debe tener en cuenta la peculiaridad del mes de enero, donde el Saldo del año anterior
 # debe sumarse a las aportaciones realizadas dentro de ese mes. Ese requiere de un tratamiento especial sobre los datos.
 # Ese tratamiento especial se resume en tener un unico valor de deposito para cada mes de cada ejercicio. Como ya se dijo,
-# el mes de enero es especial pues hay que sumarle el saldo del ano anterior. El tratamiento se resume en 4 pasos:
-# (1) Usar groupby para agrupar datos por mes y año. Luego, aplicar función filtrar_enero para conservar solo la última fila de enero.
-ap                    = ap.groupby(ap['Fecha'].dt.year).apply(filtrar_enero).reset_index(drop=True)
-
+# el mes de enero es especial pues hay que sumarle el saldo del ano anterior. El tratamiento se resume en 4 pasos, que
+# LibroFondo.agregar realiza solo sobre los movimientos nuevos:
+# (1) Conservar solo la última fila de enero de cada año (filtrar_enero_vectorizado, sin groupby().apply()).
 # (2) Identificar las filas correspondientes al mes de enero para asignar a los depósitos el valor del saldo
-ene                   = ap['Fecha'].dt.month == 1
-ap.loc[ene,'Depósito']= ap.loc[ene, 'Saldo']
-# (3) set index
-ap                    = ap.set_index('Fecha')                   
-# (4) se agrupan sumando las operaciones de los restantes meses.
-ap_mes                = ap.groupby(pd.Grouper(freq='M')).sum()
+# (3) y (4) se agrupan por año y mes sumando las operaciones de los restantes meses (libro.deposito_mensual).
 
 # La cooperativa ACOFINGES calcula el interes mensual. Para seleccionar el ejercicio se realizan los siguientes pasos
 # (1) Se selecciona un ejercicio (año); (2) Se crea mascara y (3) Se realizan los cálculos del interés compuesto. 
@@ -66,11 +67,9 @@ intereses_anual         = {2019:7, 2020:5.5, 2021:2.0, 2022:5, 2023:4.42, 2024:4
 
 ejercicio             = 2024
 interes_mes           = intereses_anual.get(ejercicio)/12
-mask                  = (ap_mes.index.year == ejercicio)
-year                  = ap_mes.loc[mask]
 
-#
-datos                 = ejercicio_anual(year, interes_mes)
+# Depósitos mensuales del ejercicio e interés compuesto
+datos                 = libro.ejercicio(ejercicio, interes_mes)
 
 resultado             = datos['resultado'].sum().round(2)
 Saldo                 = datos['Depósito'].sum()
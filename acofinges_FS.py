@@ -14,10 +14,9 @@ from finanzas import *
 # Se leen los datos de los archivos correspondientes a la cuenta del Fondo Solidario de la cooperativa ACOFINGES
 # (1) Se define ruta; (2) Se lee archivo CSV; y (3) Se cambia la columna Fecha a índice
 main_dir              = '/home/carlos/workbenchPython/finanzas/datos/'
-fs                    = pd.read_csv(main_dir+'FS.csv', parse_dates=['Fecha'], dayfirst=True, decimal=".", thousands=',')
-# Convertir con manejo de errores, errors="coerce" convierte valores inválidos en NaN, evitando fallos.
-fs['Depósito']        = pd.to_numeric(fs['Depósito'], errors='coerce').fillna(0)  # Convierte, pone NaN en errores
-fs['Saldo']           = pd.to_numeric(fs['Saldo'], errors='coerce').fillna(0)  # Convierte, pone NaN en errores
+# Al leer se convierten 'Depósito' y 'Saldo' con errors="coerce" (valores inválidos a 0). El resultado se guarda
+# en FS.csv.parquet y se reutiliza mientras el CSV no cambie.
+fs                    = leer_csv_cacheado(main_dir+'FS.csv', fechas=['Fecha'], numericas=['Depósito', 'Saldo'])
 #set index
 fs                    = fs.set_index('Fecha')                   
 
@@ -50,70 +49,37 @@ plot_barras(fsr, apilado=True, rotulos=['Year','US$','Aportaciones y redimiento
 # (3) También, se agrega una nueva columna, correspondiente al número de días en un año sujeto a la tasa de interés anual
 
 # 1/
-fs.index              = fs.index.map(cambiar_fecha)
+fs.index              = cambiar_fecha(fs.index)
 # 2/
 mask                  = (fs.index.month == 1) & (fs.index.day == 1) 
 fs.loc[mask, ['Depósito', 'Saldo']] = fs.loc[mask, ['Saldo', 'Depósito']].values
 # 3/
 fs['dias']            = 360-fs.index.dayofyear
 
-# Se establecen algunas variables:
-# El inicio de cada año como el 1 de enero y el final como el 30 de diciembre.
-fecha_ini             =  [datetime(k,1,1)   for k in fsr.index]
-fecha_fin             =  [datetime(k,12,30) for k in fsr.index]
 # Se utilizan los intereses publicados por ACOFINGES
-intereses_anual       =  {2022:6.77, 2023:6.5, 2024:6.38} #Interés diario 
-
-# Mediane un lazo for, se calcula el interés compuesto anual, excluyendo el 31 de diciembre
-resultados            = []
-for k, year in enumerate(fsr.index):
-    interes           = intereses_anual.get(year)/365 #interes diario
-    mask              = (fs.index >= fecha_ini[k]) & (fs.index <= fecha_fin[k])
-    anual             = fs.loc[mask].copy()
-    # Aplicar la función fila por fila
-    anual['compuesto']= anual.apply(lambda row: compound_interest(row['Depósito'], interes, row['dias']), axis=1).round(2)
-    anual['resultado']= anual['compuesto']-anual['Depósito']
-    resultados.append(anual['resultado'].sum().round(2))
-
-# Se extraen los rendimientos anuales calculados por ACOFIGES
-acofinge              = fs.loc[(fs.index.month == 1) & (fs.index.day == 1)]['Saldo'].values.tolist()
-#year
-year                  = fs.loc[(fs.index.month == 1) & (fs.index.day == 1)].index.year.values.tolist()
-year                  = [y - 1 for y in year]
-# Se crea nuevo dataframe con ambos resultados
-compara              = pd.DataFrame({'Año':year,'ACOFINGES':acofinge,'CALCULADO':resultados})
-# Set index
-compara              = compara.set_index('Año')                   
+intereses_anual       =  {2022:6.77, 2023:6.5, 2024:6.38} #Interés anual, se convierte a diario con base 365
+
+# Se calcula el interés compuesto de todos los años en una sola pasada, entre el 1 de enero y el 30 de diciembre,
+# y se compara con los rendimientos abonados por ACOFINGES (saldo de cada 1 de enero).
+compara               = rendimientos_fondo(fs, intereses_anual, base_dias=360, base_interes=365)
 #PLOT
 plot_barras(compara, apilado=False, rotulos=['Year','US$','Comparación ACOFINGES vs Interés Compuesto Calculado'])
 
 #***PARTE III***
 #Se simulará la rentabilidad del fondo para nuevas inversiones durante un año. Para lo cual se toman los siguientes pasos:
-# (1) Se establece como valor inicial el último dato del año anterior. (2) Se define un valor de interés anual y 
-# (3) se crean dos listas una correspondiente a los nuevos depósitos mensuales (depo) y la otra a su respectiva fecha (fecha). 
-# La lista fecha correspondera al mismo tiempo con el indice del nuevo DataFrame
-simula                = fs.tail(1)
-new_interes           = 6.1/365
-depo_list             = []
-fecha_list            = []
-# Los elementos de la lista de depósitos están formados por el par campo/dato, {'campo':dato}.
-# Por otra parte los elementos de la lista de fechas estan formados por strings con formato de fecha, YYYY/MM/DD.
-for i in range(2,13):
-    depo_list.append({'Depósito': 850})
-    fecha_list.append('2025-'+ str(i)+'-25')
-# Con el par de listas se crea temporalmente un DataFrame, luego se concatena con el DataFrame que contiene el saldo anual inicial
-new_rows              = pd.DataFrame(depo_list, index=pd.to_datetime(fecha_list))
-simula                = pd.concat([simula, new_rows])
-# Con el nuevo DataFrame que contiene los 'depósitos' simulados se ejecutan los mismos pasos que la PARTE II.
-simula['dias']        = 360-simula.index.dayofyear
-    # Aplicar la función fila por fila
-simula['compuesto']   = simula.apply(lambda row: compound_interest(row['Depósito'], new_interes, row['dias']), axis=1).round(2)
-simula['resultado']   = simula['compuesto']-simula['Depósito']
+# (1) Se establece como valor inicial el último dato del año anterior. (2) Se definen los intereses anuales y 
+# (3) los depósitos mensuales a evaluar, junto con el mes en que empiezan (se deposita el día 25 de cada mes hasta diciembre).
+# Cada combinación interés x depósito x mes de inicio es un escenario; todos se calculan a la vez con los mismos pasos de la PARTE II.
+saldo_inicial         = fs['Depósito'].iloc[-1]
+escenarios            = simular_escenarios(saldo_inicial, intereses=[6.1], depositos=[850], meses_inicio=[2],
+                                           fecha_inicial=fs.index[-1], dia=25, base_dias=360, base_interes=365)
+# Para evaluar varias alternativas basta con ampliar las listas, p.ej. intereses=np.arange(5, 7.01, 0.1), depositos=[500, 850, 1000]
+simula                = escenarios.iloc[0]
 
 # Se agrega el resultado de la simulacion a la parte I   
-# FALTA CORREGIR: (1) EJE DE TIEMPO, AGREGAR A INDEX 1 ANYO y (2) aportaciones y (3) redondear a dos decimales
-aporta                = simula.iloc[1:,1].sum() + fsr.iloc[-1,0]
-resulta               = simula.iloc[:,-1].sum() + fsr.iloc[-1,-1]
+# FALTA CORREGIR: (1) EJE DE TIEMPO, AGREGAR A INDEX 1 ANYO
+aporta                = simula['aportacion'] + fsr.iloc[-1,0]
+resulta               = simula['resultado'] + fsr.iloc[-1,-1]
 fsr.loc[len(fsr)]     = [aporta, resulta.round(2)]
 
 # Change the last index cell to 2025
@@ -1,4 +1,23 @@
 from finanzas import *
+import argparse
+import logging
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+# MODO REPORTE
+# python bac.py --reporte DIR [--formato png|svg] [--procesos N] genera todas las figuras como archivos en DIR, sin
+# pantalla y en paralelo, en lugar de mostrarlas una a una con plt.show().
+parser                = argparse.ArgumentParser(description='Gastos e ingresos de la cuenta BAC')
+parser.add_argument('--reporte', metavar='DIR', help='Directorio donde guardar las figuras (sin pantalla)')
+parser.add_argument('--formato', choices=['png', 'svg'], default='png')
+parser.add_argument('--procesos', type=int, default=None, help='Procesos para dibujar (por defecto, todos los núcleos)')
+parser.add_argument('--metricas', action='store_true', help='Registra tiempo, filas y memoria de cada etapa (JSON)')
+args                  = parser.parse_args()
+if args.metricas:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    activar_instrumentacion(memoria=True)
+if args.reporte:
+    plt.switch_backend('Agg')
 
 # Definir categorías y palabras clave asociadas
 categories = {
@@ -16,41 +35,27 @@ categories = {
 
 
 main_dir              = '/home/carlos/workbenchPython/finanzas/datos/'
-df                    = pd.read_csv(main_dir+'bac.csv', parse_dates=['Fecha_Tran'], dayfirst=True, decimal=".", thousands=',')  
-# df                    = pd.read_csv(main_dir+'bac.csv')
 
-# PREPARACION DE DATOS
-# Convertir con manejo de errores, errors="coerce" convierte valores inválidos en NaN, evitando fallos.
-df['Fecha_Tran'] = pd.to_datetime(df['Fecha_Tran'], format='%Y-%m-%d', errors='coerce')
-
-# Filtra datos anteriores a 2016 en base de datos original
-mask                  = df['Fecha_Tran'] > datetime(2016,1,1)
-df                    = df.loc[mask].copy()
-
-# Asegurar que no haya valores nulos en la columna "Transaccion" y convertir a mayusculas
-df["Transaccion"]     = df["Transaccion"].fillna("").str.upper()
-
-# Aplicar clasificación
-df["Categoria"]       = df["Transaccion"].apply(lambda transaction: classify_transaction(transaction, categories))
-
-# Añadir una columna con las etiquetas extraídas
-df['Etiqueta']        = df['Transaccion'].apply(extract_label)
-
-# Extraer año y mes de la columna Fecha_Tran
-df['Año']             = pd.to_datetime(df['Fecha_Tran']).dt.year
-df['Mes']             = pd.to_datetime(df['Fecha_Tran']).dt.month
+# LECTURA Y PREPARACION DE DATOS, POR BLOQUES
+# El archivo se lee por bloques. En cada bloque: (1) se convierte la fecha una sola vez, con errors="coerce" los valores
+# inválidos quedan como NaT; (2) se filtran los datos anteriores a 2016; (3) se clasifican las transacciones y
+# (4) se extraen etiqueta, año y mes. Solo se conservan los totales acumulados, por lo que la memoria usada no
+# depende del tamaño del archivo.
+bloques               = leer_bac_por_bloques(main_dir+'bac.csv', categories, desde=datetime(2016,1,1), tamano_bloque=100_000)
 
 # Eliminar la categoría "Otros gastos" debido a que son gastos aun no identificados o simplemente se han ignorado en categories
-df                    = df[df["Categoria"] != "Otros gastos"] 
+# y acumular los cargos (gastos) y abonos (ingresos) por categoría, etiqueta, año y mes
+resumen               = resumen_bac(bloques, excluir=("Otros gastos",))
 
-# Se filtra para dejar unicamente un dataframe con los Cargos
-ca                    = df[df["Cargo"].notna()]
+# Gastos por categoría y resumen anual de cargos e ingresos
+gastos_por_categoria  = resumen['gastos_por_categoria']
+resumen_anual_ca      = resumen['resumen_anual']
 
-# Agrupar por categoría y sumar los gastos anuales
-gastos_por_categoria  = ca.groupby("Categoria")["Cargo"].sum().sort_values(ascending=False)
-resumen_anual_ca      = ca.groupby('Año')[['Cargo']].sum()
-resumen_anual_ab      = df.groupby('Año')[['Abono']].sum()
-resumen_anual_ca['Ingresos'] = resumen_anual_ab['Abono']
+# Modo reporte: todas las tablas ya están calculadas en 'resumen'; solo queda dibujarlas y guardarlas
+if args.reporte:
+    rutas             = generar_reporte_bac(resumen, args.reporte, formato=args.formato, procesos=args.procesos)
+    print(f"{len(rutas)} figuras guardadas en {args.reporte}")
+    raise SystemExit
 
 # 1/ PLOT, BARRAS. GASTOS Vs INGRESOS. Agrupar por año para sumar gastos e ingresos
 plot_barras(resumen_anual_ca, apilado=False, rotulos=['Year','US$','Ingresos vs Gastos'])
@@ -74,7 +79,7 @@ plt.title("Distribución de Gastos por Categoría")
 plt.show()
 
 # 4/ PLOT, HEAT MAP. Por año y categoría, sumando los gastos.
-heatmap_data_anual = ca.pivot_table(index="Categoria", columns="Año", values="Cargo", aggfunc="sum", fill_value=0)
+heatmap_data_anual = resumen['calor_anual']
 plt.figure(figsize=(12, 4))
 sns.heatmap(heatmap_data_anual, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5)
 plt.xlabel("Año")
@@ -84,17 +89,8 @@ plt.xticks(rotation=45)
 plt.show()
 
 # PLOT.HEAT MAP. Generar un heatmap por cada categoría, dibujando año vs subcategorias
-# Obtener todas las categorías únicas
-categorias_unicas = ca["Categoria"].unique()
-
-for categoria in categorias_unicas:
-    datos_categoria = top_subcategories(ca, categoria)
-    # Extraer año y mes
-    datos_categoria["Año"] = datos_categoria["Fecha_Tran"].dt.year
-    datos_categoria["Mes"] = datos_categoria["Fecha_Tran"].dt.month
-    # Crear tabla pivote (Etiqueta como filas, Año como columnas)
-    heatmap_data = datos_categoria.pivot_table(index="Etiqueta", columns="Año", values="Cargo", aggfunc="sum", fill_value=0)
-    
+# Tabla pivote (Etiqueta como filas, Año como columnas) con las principales subcategorías de cada categoría
+for categoria, heatmap_data in resumen['calor_etiquetas'].items():
     plt.figure(figsize=(12, 4))
     sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5)
     plt.xlabel("Año")
@@ -106,12 +102,8 @@ for categoria in categorias_unicas:
 #
 
 # Generar un heatmap por cada categoría, dibujando año vs mes
-for categoria in categorias_unicas:
-    datos_categoria = ca[ca["Categoria"] == categoria]
-
-    # Crear tabla pivote (Año como filas, Mes como columnas)
-    heatmap_data = datos_categoria.pivot_table(index="Año", columns="Mes", values="Cargo", aggfunc="sum", fill_value=0)
-    
+# Tabla pivote (Año como filas, Mes como columnas)
+for categoria, heatmap_data in resumen['calor_mensual'].items():
     # Graficar
     plt.figure(figsize=(12, 4))
     sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5)
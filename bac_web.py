@@ -1,4 +1,14 @@
 from finanzas import * 
+import argparse
+import gzip
+import multiprocessing
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, render_template, request, abort, make_response
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import seaborn as sns
 # Definir categorías y palabras clave asociadas
 categories = {
     "Supermercado/hogar": ["SELECTOS:", "SUPER:", "HOGAR:", "CARNICERIA:"],
@@ -15,17 +25,108 @@ categories = {
 
 app = Flask(__name__)
 
-# Función para generar el gráfico comparativo por año
-# Función para generar el gráfico comparativo por año o un gráfico de pastel
-def generar_grafico2imagen(df, tipo):
+conexion_bd  = partial(obtener_conexion_pool, host="localhost", user="carlos", psw="mc91067CEMC*", db="bac")
 
-    # fig, ax = plt.subplots()
-    fig, ax = plt.subplots(figsize=(14, 4))  # Ajusta el ancho y alto
+# La clave autoincremental 'id' solo existe en las tablas creadas por cargar_bac.py o migradas con
+# cargar_bac.py --migrar; se consulta una vez al iniciar. Si no se puede saber, se supone que no existe.
+def columna_id_movimientos():
+    try:
+        conexion = conexion_bd()
+        try:
+            return 'id' if 'id' in columnas_tabla(conexion, 'movimientos') else None
+        finally:
+            conexion.close()
+    except Exception as err:
+        print(f"No se pudieron consultar las columnas de movimientos: {err}")
+        return None
+
+columna_id   = columna_id_movimientos()
+
+# consulta MySQL. El filtro es un rango sobre fecha_tran (no YEAR(fecha_tran) > 2015) para usar su índice, creado por
+# cargar_bac.py; las fechas nulas quedan fuera igual que antes
+consulta_sql = f"""
+    SELECT {'id, ' if columna_id else ''}fecha_tran, transaccion, abono, cargo, 
+    YEAR(fecha_tran) AS año, MONTH(fecha_tran) AS mes, 
+    SUBSTRING_INDEX(transaccion, ':', 1) AS etiquetaX
+    FROM movimientos
+    WHERE fecha_tran >= '2016-01-01'
+"""
+# Datos del proceso: conexiones desde un pool y movimientos clasificados en cache. Pasado el TTL solo se leen
+# los movimientos nuevos: con 'id', los de id posterior al último cargado, aunque su fecha_tran sea anterior; sin
+# ella, desde la última fecha_tran cargada. Se guardan con tipos compactos (categorías, enteros pequeños y cadenas
+# Arrow), que ocupan varias veces menos memoria que las columnas object/int64.
+movimientos  = CacheMovimientos(conexion_bd, consulta_sql, categories, ttl=300, compactar=True, columna_id=columna_id)
+
+# Modo de agregación en la base de datos: la clasificación (CASE WHEN ... LIKE) y el GROUP BY año, categoria se
+# ejecutan en MySQL y solo llega el resultado agregado. Si la consulta falla se usan los movimientos en pandas y no
+# se vuelve a intentar hasta que pase el TTL ('momento' es el del último intento, con o sin éxito).
+AGREGAR_EN_SQL = True
+_agregado      = {"momento": None, "datos": None}
+# Una sola actualización a la vez: los demás hilos siguen usando los datos anteriores mientras tanto
+_datos_lock    = threading.Lock()
+
+# Los gráficos se calculan sobre un cubo de gastos (categoria, año, mes) construido una vez por versión de los
+# movimientos; las vistas de cada gráfico son sumas del cubo, sin recorrer de nuevo los movimientos.
+COLUMNAS_CUBO  = dict(categoria="categoria", etiqueta="etiqueta", anio="año", mes="mes", cargo="cargo", abono="abono",
+                      solo_cargos=False)
+_cubo          = {"version": None, "datos": None}
+
+def agregado_vencido():
+    return _agregado["momento"] is None or monotonic() - _agregado["momento"] > movimientos.ttl
+
+def datos_graficos():
+    if AGREGAR_EN_SQL:
+        # Si otro hilo ya está actualizando y hay datos anteriores, se sirven esos sin esperar
+        if agregado_vencido() and _datos_lock.acquire(blocking=_agregado["datos"] is None):
+            try:
+                # Mientras se esperaba, otro hilo pudo intentarlo ya (y fallar): no se repite la consulta
+                if agregado_vencido():
+                    datos = obtener_agregado_sql(conexion_bd, categories)
+                    _agregado["momento"] = monotonic()
+                    if datos is not None:
+                        _agregado["datos"] = CuboGastos(datos, **COLUMNAS_CUBO)
+            finally:
+                _datos_lock.release()
+        if _agregado["datos"] is not None:
+            return _agregado["datos"]
+
+    df = movimientos.obtener()
+    with _datos_lock:
+        if _cubo["version"] != movimientos.version:
+            with etapa("cubo_gastos", filas=len(df)):
+                _cubo.update(version=movimientos.version, datos=CuboGastos.desde_movimientos(df, **COLUMNAS_CUBO))
+        return _cubo["datos"]
+
+# Gráficos ya dibujados, por tipo y huella de los datos agregados
+graficos = CacheGraficos(max_bytes=32 * 1024 * 1024)
+
+# Función para obtener, a partir del cubo de gastos, los datos agregados que dibuja cada tipo de gráfico
+def agregado_grafico(cubo, tipo):
 
     if tipo == "barras":
         # 1/ Ingresos vs Gastos por categoria
-        resultado = gastos_ingresos(df,categories)
+        return gastos_ingresos(cubo.datos,categories)
+
+    elif tipo == "pastel":
+        # 2/ Gastos por categoria (pastel)   
+        return cubo.gastos_por_categoria()
 
+    elif tipo == "calor":
+        # 3/ Gastos por categoria (heat map).Por año y categoría, sumando los gastos.
+        return cubo.calor_anual()
+
+    return None
+
+# Función para dibujar el gráfico comparativo por año o un gráfico de pastel, devuelve la imagen PNG.
+# Usa una Figure con el lienzo Agg en lugar de pyplot, cuyo estado global no es seguro entre hilos; se ejecuta en
+# los procesos de dibujo (ver dibujar_en_pool).
+def dibujar_grafico(resultado, tipo):
+
+    fig = Figure(figsize=(14, 4))  # Ajusta el ancho y alto
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if tipo == "barras":
         x = range(len(resultado["año"]))  # Posiciones en el eje X
         ancho = 0.3  # Ancho de las barras
 
@@ -40,56 +141,206 @@ def generar_grafico2imagen(df, tipo):
         ax.legend()
 
     elif tipo == "pastel":
-        # 2/ Gastos por categoria (pastel)   
-        resultado  = df.groupby("categoria")["cargo"].sum().sort_values(ascending=False)
-
-        ax.pie(resultado, labels=resultado.index, autopct="%1.1f%%", startangle=90, colors=plt.cm.Paired.colors)
+        ax.pie(resultado, labels=resultado.index, autopct="%1.1f%%", startangle=90, colors=colormaps["Paired"].colors)
         ax.set_title("Distribución de Gastos por Categoría")
 
     elif tipo == "calor":
-        # 3/ Gastos por categoria (heat map).Por año y categoría, sumando los gastos.
-        heatmap_data_anual = df.pivot_table(index="categoria", columns="año", values="cargo", aggfunc="sum", fill_value=0)
-        # ax.figure()
-        sns.heatmap(heatmap_data_anual, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5)
+        sns.heatmap(resultado, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5, ax=ax)
         ax.set_title("Distribución de Gastos por Categoría")
 
-    else:
+    # Convertir la gráfica en imagen PNG y liberar la figura
+    img = io.BytesIO()
+    fig.savefig(img, format="png")
+    fig.clear()
+
+    return img.getvalue()
+
+# Pool de procesos de tamaño fijo para dibujar los gráficos fuera de los hilos que atienden las peticiones.
+# Si se piden a la vez varios gráficos con la misma huella, solo se dibuja uno y los demás esperan su resultado
+# ('pendientes' guarda, por huella, el futuro y el pool que lo ejecuta).
+PROCESOS_GRAFICOS = 2
+_pool             = {"ejecutor": None, "pendientes": {}}
+_pool_lock        = threading.Lock()
+
+def _enviar_al_pool(resultado, tipo):
+    """Envía el dibujo al pool (con _pool_lock tomado), creándolo o reemplazándolo si hace falta."""
+    for _ in range(2):
+        if _pool["ejecutor"] is None:
+            # 'spawn': no se copia con fork un proceso que ya tiene hilos (servidor, precálculo)
+            _pool["ejecutor"] = ProcessPoolExecutor(max_workers=PROCESOS_GRAFICOS,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        ejecutor = _pool["ejecutor"]
+        try:
+            return ejecutor.submit(dibujar_grafico, resultado, tipo), ejecutor
+        except BrokenProcessPool:
+            # El pool se rompió y ningún hilo lo ha descartado todavía: se cierra y se crea otro
+            ejecutor.shutdown(wait=False, cancel_futures=True)
+            _pool["ejecutor"] = None
+    raise BrokenProcessPool("No se pudo crear el pool de procesos de dibujo")
+
+def dibujar_en_pool(resultado, tipo, etag):
+    with _pool_lock:
+        futuro, ejecutor = _pool["pendientes"].get(etag, (None, None))
+        if futuro is None:
+            futuro, ejecutor = _pool["pendientes"][etag] = _enviar_al_pool(resultado, tipo)
+    try:
+        with etapa("dibujar_grafico", filas=len(resultado)):
+            return futuro.result()
+    except BrokenProcessPool:
+        # Un proceso de dibujo terminó de forma anómala: se cierra el pool (sus procesos y su hilo de gestión), se
+        # descarta si otro hilo no lo ha reemplazado ya, y se dibuja en este hilo
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+        with _pool_lock:
+            if _pool["ejecutor"] is ejecutor:
+                _pool["ejecutor"] = None
+        return dibujar_grafico(resultado, tipo)
+    finally:
+        with _pool_lock:
+            if _pool["pendientes"].get(etag, (None,))[0] is futuro:
+                del _pool["pendientes"][etag]
+
+# Función para obtener la imagen PNG de un gráfico y su ETag, dibujándola solo si sus datos han cambiado
+def grafico_png(cubo, tipo):
+    resultado = agregado_grafico(cubo, tipo)
+    if resultado is None:
+        return None, None
+
+    etag = f"{tipo}-{huella_datos(resultado)}"
+    png = graficos.obtener(etag)
+    if png is None:
+        png = dibujar_en_pool(resultado, tipo, etag)
+        graficos.guardar(etag, png)
+
+    return png, etag
+
+# Función para generar el gráfico comparativo por año o un gráfico de pastel, en base64
+@instrumentar()
+def generar_grafico2imagen(cubo, tipo):
+    png, _ = grafico_png(cubo, tipo)
+    if png is None:
         return None
 
     # Convertir la gráfica en imagen base64
-    img = io.BytesIO()
-    plt.savefig(img, format="png")
-    img.seek(0)
-    img_base64 = base64.b64encode(img.getvalue()).decode()
-
-    return img_base64
+    return base64.b64encode(png).decode()
 
 # Ruta principal de la aplicación Flask
 @app.route("/", methods=["GET", "POST"])
 def index():
     img_base64 = None
 
-# consulta MySQL
-    consulta_sql = """
-        SELECT fecha_tran, transaccion, abono, cargo, 
-        YEAR(fecha_tran) AS año, MONTH(fecha_tran) AS mes, 
-        SUBSTRING_INDEX(transaccion, ':', 1) AS etiquetaX
-        FROM movimientos
-        WHERE YEAR(fecha_tran) IS NOT NULL AND YEAR(fecha_tran) > 2015;
-    """
-# Se ejecuta la consulta a la BD
-    df  = obtener_datos_df(host="localhost", user="carlos", psw="mc91067CEMC*", db="bac", consulta=consulta_sql)
-    # Clasificar transacciones segun categoria
-    df["categoria"] = df["transaccion"].apply(lambda transaction: classify_transaction(transaction, categories))
-    # Eliminar la categoría "Otros gastos" debido a que son gastos aun no identificados o simplemente se han ignorado en categories
-    df  = df[df["categoria"] != "Otros gastos"] 
-
     if request.method == "POST":
         opcion = request.form.get("opcion")
-        img_base64 = generar_grafico2imagen(df, opcion)
+        # Cubo de gastos por año y categoría (en SQL o desde los movimientos clasificados), sin "Otros gastos"
+        img_base64 = generar_grafico2imagen(datos_graficos(), opcion)
 
     return render_template("index.html", img_base64=img_base64)
 
+# Imagen PNG de un gráfico, con ETag para que el navegador reutilice la que ya tiene (304)
+@app.route("/grafico/<tipo>.png")
+def grafico(tipo):
+    png, etag = grafico_png(datos_graficos(), tipo)
+    if png is None:
+        abort(404)
+
+    respuesta = make_response(png)
+    respuesta.mimetype = "image/png"
+    respuesta.set_etag(etag)
+    respuesta.cache_control.no_cache = True
+    return respuesta.make_conditional(request)
+
+# API de agregados: los mismos datos de los gráficos en JSON columnar o Arrow IPC, para dibujarlos en el cliente
+# sin renderizar imágenes en el servidor. El contenido serializado (y su versión gzip) se guarda por huella de los
+# datos y se responde con ETag, de modo que una petición repetida cuesta una búsqueda en la cache o un 304.
+VISTAS_API   = {"gastos_ingresos": "barras", "categorias": "pastel", "categoria_anio": "calor"}
+TIPOS_API    = {"json": "application/json", "arrow": "application/vnd.apache.arrow.stream"}
+serializados = CacheGraficos(max_bytes=8 * 1024 * 1024)
+
+def agregado_serializado(cubo, vista, formato, comprimir):
+    resultado = agregado_grafico(cubo, VISTAS_API[vista])
+    etag = f"{vista}-{huella_datos(resultado)}.{formato}" + (".gz" if comprimir else "")
+    contenido = serializados.obtener(etag)
+    if contenido is None:
+        contenido = serializar_tabla(resultado, formato)
+        if comprimir:
+            contenido = gzip.compress(contenido, compresslevel=6)
+        serializados.guardar(etag, contenido)
+
+    return contenido, etag
+
+@app.route("/api/<vista>.<formato>")
+def api_agregado(vista, formato):
+    if vista not in VISTAS_API or formato not in TIPOS_API:
+        abort(404)
+
+    comprimir = request.accept_encodings.quality("gzip") > 0
+    try:
+        contenido, etag = agregado_serializado(datos_graficos(), vista, formato, comprimir)
+    except ImportError:
+        # Arrow requiere pyarrow
+        abort(406)
+
+    respuesta = make_response(contenido)
+    respuesta.mimetype = TIPOS_API[formato]
+    if comprimir:
+        respuesta.headers["Content-Encoding"] = "gzip"
+    respuesta.vary.add("Accept-Encoding")
+    respuesta.set_etag(etag)
+    respuesta.cache_control.no_cache = True
+    return respuesta.make_conditional(request)
+
+# Métricas de las etapas (SQL, clasificación, agregación, gráficos) en formato Prometheus. Solo hay datos si la
+# instrumentación está activa (FINANZAS_INSTRUMENTAR=1); desactivada, las funciones no se miden.
+@app.route("/metrics")
+def metrics():
+    respuesta = make_response(metricas_prometheus())
+    respuesta.mimetype = "text/plain"
+    respuesta.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return respuesta
+
+# Precálculo en segundo plano: cada 'intervalo' segundos se revisan los datos y, si han cambiado, se dibujan los tres
+# gráficos, de modo que las peticiones los encuentran ya en la cache de gráficos.
+TIPOS_GRAFICO = ("barras", "pastel", "calor")
+_detener      = threading.Event()
+
+def precalcular_graficos(intervalo=5.0):
+    ultimo = None
+    while not _detener.is_set():
+        try:
+            cubo = datos_graficos()
+            if cubo is not ultimo:
+                for tipo in TIPOS_GRAFICO:
+                    grafico_png(cubo, tipo)
+                ultimo = cubo
+        except Exception as err:
+            print(f"Error al precalcular los gráficos: {err}")
+        _detener.wait(intervalo)
+
+def iniciar_precalculo(intervalo=5.0):
+    hilo = threading.Thread(target=precalcular_graficos, args=(intervalo,), name="precalculo-graficos", daemon=True)
+    hilo.start()
+    return hilo
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Por defecto, servidor de desarrollo. Con --produccion: servidor WSGI con varios hilos (waitress si está
+    # instalado, si no el servidor de Flask con hilos), pool de procesos de dibujo y precálculo de los gráficos.
+    parser = argparse.ArgumentParser(description="Panel de gastos e ingresos")
+    parser.add_argument("--produccion", action="store_true")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=5000)
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos que atienden peticiones")
+    parser.add_argument("--procesos", type=int, default=PROCESOS_GRAFICOS, help="Procesos para dibujar gráficos")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre revisiones del precálculo")
+    args = parser.parse_args()
+
+    if not args.produccion:
+        app.run(debug=True)
+    else:
+        PROCESOS_GRAFICOS = args.procesos
+        iniciar_precalculo(args.intervalo)
+        try:
+            from waitress import serve
+        except ImportError:
+            app.run(host=args.host, port=args.puerto, threaded=True, debug=False)
+        else:
+            serve(app, host=args.host, port=args.puerto, threads=args.hilos)
 
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Benchmarks de las rutas calientes de finanzas, sobre datos sintéticos (ver datos_sinteticos.py) de 10k, 1M o 10M filas.
+# Cada caso mide el tiempo (el mejor de varias repeticiones), el rendimiento en filas por segundo y la memoria pico
+# (tracemalloc, en una ejecución aparte para no afectar al tiempo). Las versiones por fila o por grupo se miden junto a
+# las vectorizadas que las reemplazan, para seguir regresiones y mejoras.
+#
+# Uso:   python benchmarks/bench_finanzas.py [--filas 10k 1M] [--casos extract_label ...] [--repeticiones 3]
+#                                            [--json resultados.json] [--comparar anteriores.json]
+# Los casos por fila/grupo ('lentos') se omiten por encima de --max-filas-lentas (por defecto 1M).
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+import warnings
+from time import perf_counter
+
+import pandas as pd
+
+# Sin pantalla: los gráficos solo se dibujan en memoria
+os.environ.setdefault('MPLBACKEND', 'Agg')
+# groupby().apply(filtrar_enero) avisa de un cambio futuro de pandas; se mide tal como lo usaban los scripts
+warnings.simplefilter('ignore', FutureWarning)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import finanzas
+from datos_sinteticos import TAMANOS, CATEGORIAS, movimientos_bac, estado_fondo, aportaciones
+
+# Interés anual (%) de los ejercicios de los datos sintéticos
+INTERESES = {anio: 4.0 + 0.25 * (anio - 2000) for anio in range(2000, 2025)}
+
+
+def preparar(n):
+    """Datos de entrada de todos los casos para n filas (no se incluye en las mediciones)."""
+    bac                  = movimientos_bac(n)
+    bac['Fecha_Tran']    = pd.to_datetime(bac['Fecha_Tran'], format='%d/%m/%Y')
+    transacciones        = bac['Transaccion'].fillna('')
+
+    # Movimientos clasificados, con las columnas de bac_web
+    web = pd.DataFrame({'categoria': finanzas.clasificar_transacciones(transacciones, CATEGORIAS),
+                        'etiqueta': finanzas.extraer_etiquetas(transacciones),
+                        'año': bac['Fecha_Tran'].dt.year, 'mes': bac['Fecha_Tran'].dt.month,
+                        'cargo': bac['Cargo'], 'abono': bac['Abono']})
+    web = web[web['categoria'] != "Otros gastos"].reset_index(drop=True)
+
+    # Aportaciones de muchas cuentas (unas 1000 filas por cuenta) y sus depósitos por mes, cuenta y año
+    ap                   = aportaciones(n, cuentas=max(1, n // 1000))
+    libro                = finanzas.filtrar_enero_vectorizado(ap, 'cuenta')
+    ene                  = libro['Fecha'].dt.month == 1
+    libro['Depósito']    = libro['Depósito'].where(~ene, libro['Saldo'])
+    libro['Fecha']       = libro['Fecha'] + pd.offsets.MonthEnd(0)
+    mensual              = libro.groupby(['cuenta', 'Fecha'])[['Depósito']].sum().reset_index(level=0)
+    ejercicios           = [grupo[['Depósito']] for _, grupo in mensual.groupby(['cuenta', mensual.index.year])]
+
+    # Fondo Solidario preparado como en acofinges_FS.py: bonificación del 31/12 al 1/1 como depósito
+    fs                   = estado_fondo(n).set_index('Fecha')
+    fs.index             = finanzas.cambiar_fecha(fs.index)
+    mask                 = (fs.index.month == 1) & (fs.index.day == 1)
+    fs.loc[mask, ['Depósito', 'Saldo']] = fs.loc[mask, ['Saldo', 'Depósito']].values
+
+    # Movimientos sin clasificar, como los lee bac_web desde MySQL
+    crudos = pd.DataFrame({'transaccion': transacciones, 'año': bac['Fecha_Tran'].dt.year,
+                           'cargo': bac['Cargo'], 'abono': bac['Abono']})
+
+    return {'transacciones': transacciones, 'categorias': finanzas.compilar_categorias(CATEGORIAS),
+            'crudos': crudos, 'web': web, 'ap': ap, 'ejercicios': ejercicios, 'fs': fs}
+
+
+def _grafico(datos):
+    """
+    Gráfico de calor de bac_web, dibujado en este proceso con dibujar_grafico: generar_grafico2imagen lo enviaría
+    al pool de procesos de dibujo, cuyo tiempo es sobre todo el de la comunicación entre procesos y cuya memoria no
+    ve tracemalloc. Incluye el cubo y su vista, no la cache de gráficos.
+    """
+    import bac_web
+    cubo = finanzas.CuboGastos.desde_movimientos(datos['web'], **bac_web.COLUMNAS_CUBO)
+    return bac_web.dibujar_grafico(bac_web.agregado_grafico(cubo, 'calor'), 'calor')
+
+
+# (nombre, lento, función sobre los datos preparados)
+CASOS = [
+    ('classify_transaction (.apply)', True,
+     lambda d: d['transacciones'].apply(finanzas.classify_transaction, args=(CATEGORIAS,))),
+    ('clasificar_transacciones', False,
+     lambda d: finanzas.clasificar_transacciones(d['transacciones'], d['categorias'])),
+    ('extract_label (.apply)', True,
+     lambda d: d['transacciones'].apply(finanzas.extract_label)),
+    ('extraer_etiquetas', False,
+     lambda d: finanzas.extraer_etiquetas(d['transacciones'])),
+    ('filtrar_enero (groupby.apply)', True,
+     lambda d: d['ap'].groupby(['cuenta', d['ap']['Fecha'].dt.year]).apply(finanzas.filtrar_enero)),
+    ('filtrar_enero_vectorizado', False,
+     lambda d: finanzas.filtrar_enero_vectorizado(d['ap'], 'cuenta')),
+    ('ejercicio_anual (por cuenta y año)', True,
+     lambda d: [finanzas.ejercicio_anual(datos, INTERESES[datos.index.year[0]] / 12) for datos in d['ejercicios']]),
+    ('resultados_apo', False,
+     lambda d: finanzas.resultados_apo(d['ap'], INTERESES)),
+    ('rendimientos_fondo', False,
+     lambda d: finanzas.rendimientos_fondo(d['fs'], INTERESES)),
+    ('gastos_ingresos', False,
+     lambda d: finanzas.gastos_ingresos(d['web'], CATEGORIAS)),
+    ('resumen_por_prefijos (por categoría)', False,
+     lambda d: finanzas.resumen_por_prefijos(d['crudos'], {categoria: (prefijos, 'abono' if categoria == 'Ingresos'
+                                                                       else 'cargo')
+                                                           for categoria, prefijos in CATEGORIAS.items() if prefijos})),
+    ('top_subcategories (por categoría)', True,
+     lambda d: [finanzas.top_subcategories(d['web'], categoria) for categoria in d['web']['categoria'].unique()]),
+    ('top_subcategories_all', False,
+     lambda d: finanzas.top_subcategories_all(d['web'])),
+    ('CuboGastos.desde_movimientos', False,
+     lambda d: finanzas.CuboGastos.desde_movimientos(d['web'], categoria='categoria', etiqueta='etiqueta', anio='año',
+                                                     mes='mes', cargo='cargo', abono='abono')),
+    ('dibujar_grafico (calor)', False, _grafico),
+]
+
+
+def medir(funcion, datos, repeticiones):
+    """Devuelve el menor tiempo de 'repeticiones' ejecuciones y la memoria pico (bytes) de una ejecución más."""
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = perf_counter()
+        funcion(datos)
+        tiempos.append(perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcion(datos)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(tiempos), pico
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks de finanzas sobre datos sintéticos')
+    parser.add_argument('--filas', nargs='+', choices=list(TAMANOS), default=['10k'])
+    parser.add_argument('--casos', nargs='+', help='Casos a medir (subcadena del nombre); por defecto todos')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--max-filas-lentas', type=int, default=1_000_000,
+                        help='Tamaño a partir del cual se omiten los casos por fila o por grupo')
+    parser.add_argument('--json', help='Archivo donde guardar los resultados')
+    parser.add_argument('--comparar', help='Resultados anteriores (--json) con los que comparar el tiempo')
+    args   = parser.parse_args()
+
+    anteriores = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            anteriores = {(r['caso'], r['filas']): r['segundos'] for r in json.load(archivo)}
+
+    casos      = [caso for caso in CASOS if not args.casos or any(texto in caso[0] for texto in args.casos)]
+    resultados = []
+    print(f"{'caso':36} {'filas':>10} {'segundos':>10} {'filas/s':>12} {'pico MB':>9}" + ('  vs anterior' if anteriores else ''))
+    for tamano in args.filas:
+        n     = TAMANOS[tamano]
+        datos = preparar(n)
+        for nombre, lento, funcion in casos:
+            if lento and n > args.max_filas_lentas:
+                print(f"{nombre:36} {n:>10} {'omitido':>10}")
+                continue
+            segundos, pico = medir(funcion, datos, args.repeticiones)
+            resultado      = {'caso': nombre, 'filas': n, 'segundos': segundos,
+                              'filas_por_segundo': n / segundos, 'memoria_pico_mb': pico / 2**20}
+            resultados.append(resultado)
+            linea          = f"{nombre:36} {n:>10} {segundos:>10.4f} {n / segundos:>12,.0f} {pico / 2**20:>9.1f}"
+            if (nombre, n) in anteriores:
+                linea     += f"  x{segundos / anteriores[(nombre, n)]:.2f}"
+            print(linea)
+        del datos
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=1)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Tiempo de importación de finanzas. Cada medición se hace en un intérprete nuevo, para no reutilizar módulos ya
+# cargados, y se compara con el tiempo de importar solo pandas y NumPy (el mínimo que necesita el núcleo).
+# Además se comprueba que 'import finanzas' no carga dependencias de gráficos, web ni base de datos.
+#
+# Uso:   python benchmarks/bench_importacion.py [--repeticiones 5] [--max-segundos 0.15]
+# Termina con código 1 si se carga alguna dependencia pesada o si el costo propio de finanzas supera el límite.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben cargarse al importar finanzas
+PESADOS   = ['matplotlib', 'seaborn', 'scipy', 'flask', 'xlrd', 'openpyxl', 'python_calamine', 'mysql']
+
+MEDICION  = """
+import json, sys
+from time import perf_counter
+inicio = perf_counter()
+import {modulo}
+print(json.dumps({{'segundos': perf_counter() - inicio,
+                   'pesados': [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+
+def medir(modulo, repeticiones):
+    """Importa 'modulo' en 'repeticiones' intérpretes nuevos y devuelve el menor tiempo y los módulos pesados cargados."""
+    tiempos, pesados = [], set()
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, '-c', MEDICION.format(modulo=modulo, pesados=PESADOS)],
+                                cwd=RAIZ, capture_output=True, text=True, check=True)
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(resultado['segundos'])
+        pesados.update(resultado['pesados'])
+    return min(tiempos), sorted(pesados)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempo de importación de finanzas')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--max-segundos', type=float, default=0.15,
+                        help='Costo máximo de finanzas por encima de pandas + NumPy')
+    args = parser.parse_args()
+
+    base, _               = medir('pandas, numpy', args.repeticiones)
+    finanzas, pesados     = medir('finanzas', args.repeticiones)
+    propio                = finanzas - base
+
+    print(f'pandas + numpy : {base * 1000:8.1f} ms')
+    print(f'finanzas       : {finanzas * 1000:8.1f} ms  (propio: {propio * 1000:.1f} ms)')
+    print(f'pesados        : {", ".join(pesados) or "ninguno"}')
+
+    if pesados or propio > args.max_segundos:
+        sys.exit(1)
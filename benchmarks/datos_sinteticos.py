@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Generador de datos sintéticos con la forma de los archivos de datos del proyecto, para los benchmarks:
+#   bac.csv            Fecha_Tran (dd/mm/aaaa), Transaccion ('ETIQUETA: detalle'), Cargo, Abono
+#   FS.csv             Fecha, Depósito, Saldo; el 31/12 de cada año se abona la bonificación del fondo
+#   acofingesAPO.csv   Fecha, Depósito, Saldo (con la columna 'cuenta' si se piden varias cuentas)
+# Los datos dependen solo del número de filas y de la semilla, de modo que las mediciones son reproducibles.
+#
+# Uso:   python benchmarks/datos_sinteticos.py DIR [--filas 10k|1M|10M] [--semilla 0]
+# Escribe bac.csv, FS.csv y acofingesAPO.csv en DIR.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Tamaños de los benchmarks
+TAMANOS     = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+# Mismas categorías que bac.py y bac_web.py
+CATEGORIAS  = {
+    "Supermercado/hogar": ["SELECTOS:", "SUPER:", "HOGAR:", "CARNICERIA:"],
+    "Servicios básicos": ["SERVICIOS:", "IMPUESTO:", "TINTORERIA:"],
+    "Salud y bienestar": ["MED:", "PODOLOGO:", "VET:"],
+    "Restaurantes/Entreten.": ["RST:","CINE:", "MUSEO:", "MEMBER:", "RECREACION:", "LIBRERIA:"],
+    "Ropa y accesorios": ["ROPA-ZAP:", "PERFUMERIA:"],
+    "Viajes/transporte": ["VUELO:", "HOTEL:", "AUTOBUS:", "TREN:", "VISA:","UBER:"],
+    "Retiro de cajeros": ["RETIRO NAC.:","RETIRO INT.:"],
+    "Ingresos":["UES:", "CDA:","REEMBOLSO:", "REINTEGRO:"],
+    "Otros gastos": []
+}
+
+# Etiquetas que no pertenecen a ninguna categoría ("Otros gastos")
+OTRAS       = ["TRANSF.:", "DONACION:", "DEPOSITO DAP"]
+
+
+def _fechas(rng, n, desde='2014-01-01', hasta='2024-12-30'):
+    """n fechas aleatorias entre 'desde' y 'hasta', ordenadas."""
+    inicio = pd.Timestamp(desde)
+    dias   = (pd.Timestamp(hasta) - inicio).days
+    return inicio + pd.to_timedelta(np.sort(rng.integers(0, dias + 1, n)), unit='D')
+
+
+def movimientos_bac(n, semilla=0):
+    """Movimientos bancarios con la forma de bac.csv, con las columnas tal como se leen del archivo."""
+    rng       = np.random.default_rng(semilla)
+    etiquetas = np.array([etiqueta for lista in CATEGORIAS.values() for etiqueta in lista] + OTRAS)
+    detalle   = np.char.add(' COMERCIO ', rng.integers(0, 50, n).astype(str))
+    transaccion = pd.Series(np.char.add(etiquetas[rng.integers(0, len(etiquetas), n)], detalle), dtype=object)
+    # Algunas transacciones vienen vacías en los estados de cuenta
+    transaccion[rng.random(n) < 0.01] = None
+
+    cargo     = np.where(rng.random(n) < 0.8, (rng.random(n) * 200).round(2), np.nan)
+    abono     = np.where(np.isnan(cargo), (rng.random(n) * 1500).round(2), np.nan)
+    return pd.DataFrame({'Fecha_Tran': _fechas(rng, n).strftime('%d/%m/%Y'), 'Transaccion': transaccion,
+                         'Cargo': cargo, 'Abono': abono})
+
+
+def estado_fondo(n, semilla=0, interes=6.5):
+    """
+    Estado de cuenta del Fondo Solidario con la forma de FS.csv (Fecha ya convertida a datetime).
+    Las operaciones se reparten entre 2000 y 2024; el 31/12 de cada año se abona la bonificación (interés simple
+    sobre el saldo, suficiente para medir) y el saldo la incluye.
+    """
+    rng       = np.random.default_rng(semilla)
+    anios     = np.arange(2000, 2025)
+    # Días 2 a 360 de cada año: el cálculo usa tiempo = 360 - día del año, que no puede ser negativo
+    m         = max(n - len(anios), 0)
+    fechas    = pd.DatetimeIndex(np.sort(pd.to_datetime(rng.choice(anios, m).astype(str), format='%Y').to_numpy()
+                                         + pd.to_timedelta(rng.integers(1, 360, m), unit='D').to_numpy()))
+    deposito  = rng.integers(50, 1000, len(fechas)).astype(float)
+
+    # Una fila de bonificación por año, al final del año
+    fin       = pd.DatetimeIndex([pd.Timestamp(anio, 12, 31) for anio in anios])
+    total     = pd.Series(deposito).groupby(fechas.year).sum().reindex(anios, fill_value=0.0).cumsum()
+    bonos     = (total.to_numpy() * interes / 100 / 2).round(2)
+
+    fs        = pd.DataFrame({'Fecha': fechas.append(fin), 'Depósito': np.concatenate([deposito, bonos])})
+    fs        = fs.sort_values('Fecha', kind='stable').reset_index(drop=True)
+    fs['Saldo'] = fs['Depósito'].cumsum().round(2)
+    return fs
+
+
+def aportaciones(n, cuentas=1, semilla=0):
+    """
+    Aportaciones a la cooperativa con la forma de acofingesAPO.csv (Fecha ya convertida a datetime).
+    Con cuentas > 1 se añade la columna 'cuenta' y las filas se reparten entre las cuentas (formato largo).
+    """
+    rng       = np.random.default_rng(semilla)
+    cuenta    = np.sort(rng.integers(0, cuentas, n))
+    fechas    = _fechas(rng, n, desde='2016-01-02', hasta='2024-12-30')
+    orden     = np.lexsort((fechas.to_numpy(), cuenta))
+    ap        = pd.DataFrame({'cuenta': cuenta[orden], 'Fecha': fechas[orden],
+                              'Depósito': rng.integers(10, 200, n).astype(float)})
+    ap['Saldo'] = ap.groupby('cuenta')['Depósito'].cumsum()
+    if cuentas == 1:
+        ap = ap.drop(columns='cuenta')
+    return ap
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos con la forma de los CSV del proyecto')
+    parser.add_argument('directorio')
+    parser.add_argument('--filas', choices=list(TAMANOS), default='10k')
+    parser.add_argument('--semilla', type=int, default=0)
+    args   = parser.parse_args()
+
+    n      = TAMANOS[args.filas]
+    os.makedirs(args.directorio, exist_ok=True)
+    movimientos_bac(n, args.semilla).to_csv(os.path.join(args.directorio, 'bac.csv'), index=False)
+    for nombre, df in (('FS.csv', estado_fondo(n, args.semilla)), ('acofingesAPO.csv', aportaciones(n, 1, args.semilla))):
+        df.assign(Fecha=df['Fecha'].dt.strftime('%d/%m/%Y')).to_csv(os.path.join(args.directorio, nombre), index=False)
@@ -0,0 +1,62 @@
+from finanzas import *
+import argparse
+import getpass
+import os
+from functools import partial
+import pandas as pd
+
+# CARGA DE ESTADOS DE CUENTA EN LA BASE DE DATOS
+# python cargar_bac.py [ARCHIVO ...] [--sqlite RUTA] [--host H --usuario U --bd BD] [--tabla movimientos] [--lote N]
+#                      [--migrar]
+# Carga en la tabla de movimientos que usa bac_web.py los movimientos de los archivos exportados (CSV o Excel, con las
+# columnas de bac.csv) que aún no están en ella. Cada archivo se compara con la base de datos por separado, de modo
+# que cargar dos veces el mismo archivo, o archivos con periodos solapados, no duplica movimientos.
+# Con --migrar (una sola vez, antes de cargar) se añade la clave autoincremental 'id' a una tabla creada sin ella;
+# bac_web.py la usa si existe para leer por id los movimientos nuevos, y si no, por fecha. Sin archivos, --migrar
+# no carga bac.csv. La contraseña de MySQL se toma de la variable de entorno FINANZAS_MYSQL_PSW o se pide por teclado.
+main_dir              = '/home/carlos/workbenchPython/finanzas/datos/'
+
+parser                = argparse.ArgumentParser(description='Carga los movimientos de bac.csv en la base de datos')
+parser.add_argument('archivos', nargs='*', help='Archivos exportados (CSV o Excel); por defecto, bac.csv')
+parser.add_argument('--sqlite', metavar='RUTA', help='Base de datos SQLite en lugar de MySQL')
+parser.add_argument('--host', default='localhost')
+parser.add_argument('--usuario', default='carlos')
+parser.add_argument('--bd', default='bac')
+parser.add_argument('--tabla', default='movimientos')
+parser.add_argument('--lote', type=int, default=10_000, help='Filas de cada executemany')
+parser.add_argument('--migrar', action='store_true', help="Añade la columna id a la tabla si no la tiene")
+args                  = parser.parse_args()
+archivos              = args.archivos or ([] if args.migrar else [main_dir+'bac.csv'])
+
+if args.sqlite:
+    import sqlite3
+    dialecto          = 'sqlite'
+    conexion_bd       = partial(sqlite3.connect, args.sqlite)
+else:
+    dialecto          = 'mysql'
+    psw               = os.environ.get('FINANZAS_MYSQL_PSW') or getpass.getpass(f'Contraseña de {args.usuario}: ')
+    conexion_bd       = partial(obtener_conexion_pool, host=args.host, user=args.usuario, psw=psw, db=args.bd)
+
+if args.migrar:
+    conexion          = conexion_bd()
+    try:
+        agregada      = migrar_tabla_movimientos(conexion, tabla=args.tabla, dialecto=dialecto)
+    finally:
+        conexion.close()
+    print(f"Columna id añadida a {args.tabla}" if agregada else f"{args.tabla}: sin cambios (ya tiene id o no existe)")
+
+for ruta in archivos:
+    # Lectura única, sin cache Parquet junto al archivo. Montos vacíos como NaN (NULL en la base de datos), sin
+    # convertirlos en 0; cargar_movimientos interpreta las fechas con el día primero
+    if es_excel(ruta):
+        df            = leer_excel(ruta, fechas=['Fecha_Tran'], montos=['Cargo', 'Abono'])
+    else:
+        df            = pd.read_csv(ruta, dtype={'Transaccion': str}, thousands=',')
+    df                = df.rename(columns={'Fecha_Tran': 'fecha_tran', 'Transaccion': 'transaccion',
+                                           'Cargo': 'cargo', 'Abono': 'abono'})
+    r                 = cargar_movimientos(conexion_bd, df, tabla=args.tabla, dialecto=dialecto, tamano_lote=args.lote)
+    if r['indices']:
+        print(f"Índices creados: {', '.join(r['indices'])}")
+    print(f"{ruta}: {r['leidas']} leídas, {r['insertadas']} insertadas, {r['duplicadas']} ya cargadas, "
+          f"{r['descartadas']} sin fecha; {r['segundos']:.2f} s ({r['insertadas_por_segundo']:,.0f} insertadas/s, "
+          f"{r['leidas_por_segundo']:,.0f} leídas/s)")
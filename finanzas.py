@@ -1,22 +1,144 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request
+# Núcleo ligero: solo se importan pandas, NumPy y la biblioteca estándar. Las dependencias de gráficos (matplotlib,
+# seaborn), web (Flask) y base de datos (mysql.connector) se cargan dentro de las funciones que las usan, o al
+# pedirlas como atributo del módulo (ver __getattr__ al final), de modo que los cálculos por lotes arrancan sin ellas.
 import pandas as pd
-import matplotlib.pyplot as plt
-import xlrd
+import numpy as np
 import os
+import re
 from datetime import date,datetime,time,timedelta
-import seaborn as sns
-import scipy.stats
-import numpy as np
-import mysql.connector
 import io
 import base64
-import pandas as pd
-import mysql.connector
+import hashlib
+import json
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+from time import monotonic, perf_counter
 
-# from datetime import datetime
-import pandas as pd
+# Instrumentación opcional de las etapas costosas (lectura SQL/CSV, clasificación, agregación, gráficos). Está
+# desactivada por defecto y el costo de una función instrumentada es entonces una comprobación de un booleano.
+# Se activa con activar_instrumentacion() o con la variable de entorno FINANZAS_INSTRUMENTAR=1; cada etapa acumula
+# llamadas, tiempo, filas y (con memoria=True) la variación de memoria, y se registra como una línea JSON en el
+# logger 'finanzas.metricas'. metricas_prometheus() exporta los acumulados en el formato de texto de Prometheus.
+_instrumentacion = {"activa": os.environ.get("FINANZAS_INSTRUMENTAR") == "1", "memoria": False}
+_metricas = {}
+_metricas_lock = threading.Lock()
+registro_metricas = logging.getLogger("finanzas.metricas")
+
+
+def activar_instrumentacion(activa=True, memoria=False):
+    """
+    Activa o desactiva la instrumentación de las etapas.
+
+    Parámetros:
+        activa (bool): Si se miden las etapas.
+        memoria (bool): Si además se mide la variación de memoria de cada etapa con tracemalloc (más costoso).
+    """
+    import tracemalloc
+    _instrumentacion.update(activa=activa, memoria=activa and memoria)
+    if _instrumentacion["memoria"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not _instrumentacion["memoria"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _contar_filas(valor):
+    """Número de filas de un DataFrame, Series o arreglo; None para otros valores."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, pd.Categorical, np.ndarray)):
+        return len(valor)
+    return None
+
+
+def _registrar_etapa(nombre, segundos, filas, memoria):
+    """Acumula la medición de una etapa y la escribe como una línea JSON en el logger de métricas."""
+    with _metricas_lock:
+        acumulado = _metricas.setdefault(nombre, {"llamadas": 0, "segundos": 0.0, "filas": 0, "memoria_bytes": 0})
+        acumulado["llamadas"] += 1
+        acumulado["segundos"] += segundos
+        acumulado["filas"] += filas or 0
+        acumulado["memoria_bytes"] += memoria or 0
+    registro_metricas.info(json.dumps({"etapa": nombre, "segundos": round(segundos, 6), "filas": filas,
+                                       "memoria_bytes": memoria}))
+
+
+@contextmanager
+def etapa(nombre, filas=None):
+    """
+    Mide un bloque de código como una etapa. El bloque puede indicar las filas procesadas en el diccionario que
+    devuelve, p. ej.:  with etapa("lectura") as medida: df = ...; medida["filas"] = len(df)
+    """
+    medida = {"filas": filas}
+    if not _instrumentacion["activa"]:
+        yield medida
+        return
+    import tracemalloc
+    memoria = tracemalloc.get_traced_memory()[0] if _instrumentacion["memoria"] else None
+    inicio = perf_counter()
+    try:
+        yield medida
+    finally:
+        segundos = perf_counter() - inicio
+        if memoria is not None:
+            memoria = tracemalloc.get_traced_memory()[0] - memoria
+        _registrar_etapa(nombre, segundos, medida["filas"], memoria)
+
+
+def instrumentar(nombre=None):
+    """
+    Decorador que mide cada llamada de la función como la etapa 'nombre' (por defecto, el nombre de la función).
+    Las filas son las del primer argumento (DataFrame, Series o arreglo) o, si no lo es, las del resultado.
+    """
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _instrumentacion["activa"]:
+                return funcion(*args, **kwargs)
+            with etapa(etiqueta) as medida:
+                resultado = funcion(*args, **kwargs)
+                filas = _contar_filas(args[0]) if args else None
+                medida["filas"] = filas if filas is not None else _contar_filas(resultado)
+            return resultado
+        return envoltura
+    return decorador
+
+
+def metricas():
+    """Copia de los acumulados por etapa: {etapa: {'llamadas', 'segundos', 'filas', 'memoria_bytes'}}."""
+    with _metricas_lock:
+        return {nombre: dict(valores) for nombre, valores in _metricas.items()}
+
+
+def reiniciar_metricas():
+    """Borra los acumulados de todas las etapas."""
+    with _metricas_lock:
+        _metricas.clear()
 
+
+def metricas_prometheus():
+    """Acumulados por etapa en el formato de texto de Prometheus (version 0.0.4)."""
+    series = [("llamadas", "finanzas_etapa_llamadas_total", "counter", "Llamadas de la etapa"),
+              ("segundos", "finanzas_etapa_segundos_total", "counter", "Tiempo acumulado de la etapa, en segundos"),
+              ("filas", "finanzas_etapa_filas_total", "counter", "Filas procesadas por la etapa"),
+              # La variación de memoria puede ser negativa, por eso no es un contador
+              ("memoria_bytes", "finanzas_etapa_memoria_bytes", "gauge", "Variación de memoria acumulada de la etapa (tracemalloc)")]
+    actuales = metricas()
+    lineas = []
+    for clave, metrica, tipo, ayuda in series:
+        lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} {tipo}"]
+        for nombre, valores in sorted(actuales.items()):
+            etiqueta = nombre.replace("\\", "\\\\").replace('"', '\\"')
+            lineas.append(f'{metrica}{{etapa="{etiqueta}"}} {valores[clave]}')
+    return "\n".join(lineas) + "\n"
+
+
+@instrumentar()
 def gastos_ingresos(df, categories):
     """
     Calcula los gastos por categoría y el resumen anual de cargos e ingresos.
@@ -43,17 +165,64 @@ def gastos_ingresos(df, categories):
         return None  # Devuelve None en caso de error
 
 # Procesamiento de datos en el DataFrame
-def gastos_ingresos_2(df):
-    """Agrupa datos por año y calcula ingresos y gastos."""
-    df["año"] = df["año"].astype(int)  # Asegurar que la columna 'año' es numérica
-    # Filtrar y sumar según condiciones
-    ingresos = df[df["transaccion"].str.startswith("UES:")].groupby("año")["abono"].sum()
-    gastos = df[df["transaccion"].str.startswith("SELECTOS:")].groupby("año")["cargo"].sum()
-    # Unir los resultados
-    resumen = pd.DataFrame({"año": ingresos.index, "ingresos": ingresos.values, "gastos": gastos.values})
-    return resumen
+def resumen_por_prefijos(df, grupos, columna_transaccion='transaccion', columna_anio='año'):
+    """
+    Suma por año los montos de varios grupos de transacciones identificados por el prefijo de la descripción, en una
+    sola pasada: una extracción vectorizada del prefijo (una expresión regular con todos los prefijos, aplicada a las
+    transacciones distintas) y un único groupby por (año, grupo), sin recorrer el DataFrame una vez por prefijo.
+
+    Parámetros:
+        df (pd.DataFrame): Movimientos con la descripción, el año y las columnas de monto. No se modifica.
+        grupos (dict): {nombre: (prefijos, columna de monto)}, p. ej. {"ingresos": (["UES:"], "abono"),
+                       "gastos": (["SELECTOS:", "SUPER:"], "cargo")}.
+        columna_transaccion (str): Columna con la descripción de la transacción.
+        columna_anio (str): Columna con el año.
+
+    Retorna:
+        pd.DataFrame: Una fila por año (columna 'año') y una columna por grupo, en el orden de 'grupos'. Los años sin
+                      movimientos de un grupo tienen 0, de modo que todas las columnas quedan alineadas por año.
+
+    Raises:
+        ValueError: Si un mismo prefijo aparece en dos grupos.
+    """
+    grupo_de_prefijo = {}
+    for nombre, (prefijos, _) in grupos.items():
+        for prefijo in prefijos:
+            if grupo_de_prefijo.setdefault(prefijo, nombre) != nombre:
+                raise ValueError(f"El prefijo '{prefijo}' aparece en más de un grupo.")
+
+    # Prefijo de cada transacción distinta (se repiten mucho); los más largos primero, para que 'RETIRO' no gane a
+    # 'RETIRO NAC.:'. Las transacciones vacías (código -1) toman el NaN añadido al final
+    patron = '^(' + '|'.join(re.escape(p) for p in sorted(grupo_de_prefijo, key=len, reverse=True)) + ')'
+    nombres = list(grupos)
+    codigos, unicas = pd.factorize(df[columna_transaccion])
+    grupo_unicas = (pd.Series(unicas, dtype=object).str.extract(patron, expand=False).map(grupo_de_prefijo)
+                    .map({nombre: i for i, nombre in enumerate(nombres)}).fillna(-1).astype(int).to_numpy())
+    grupo = pd.Categorical.from_codes(np.append(grupo_unicas, -1)[codigos], nombres)
+
+    # Monto de cada fila según la columna de su grupo (una operación por columna de monto, no por prefijo)
+    columna_de_grupo = np.array([columna for _, columna in grupos.values()] + [None], dtype=object)[grupo.codes]
+    monto = pd.Series(np.nan, index=df.index)
+    for columna in {columna for _, columna in grupos.values()}:
+        monto = monto.where(columna_de_grupo != columna, df[columna])
+
+    anio = df[columna_anio].astype(int).rename('año')
+    resumen = (monto.groupby([anio, pd.Series(grupo, index=df.index, name='grupo')], observed=True).sum()
+               .unstack('grupo', fill_value=0)
+               .reindex(columns=nombres, fill_value=0))
+    resumen.columns.name = None
+    return resumen.reset_index()
+
+
+def gastos_ingresos_2(df, prefijos_ingresos=("UES:",), prefijos_gastos=("SELECTOS:",)):
+    """
+    Agrupa datos por año y calcula ingresos (abonos de 'prefijos_ingresos') y gastos (cargos de 'prefijos_gastos').
+    Ver resumen_por_prefijos; ingresos y gastos quedan alineados por año aunque no cubran los mismos años.
+    """
+    return resumen_por_prefijos(df, {"ingresos": (prefijos_ingresos, "abono"), "gastos": (prefijos_gastos, "cargo")})
 
 # Conexión a MySQL y carga única de datos en un DataFrame
+@instrumentar()
 def obtener_datos_df(host, user, psw, db, consulta):
     """
     Establece conexión con MySQL y carga datos en un DataFrame.
@@ -68,6 +237,8 @@ def obtener_datos_df(host, user, psw, db, consulta):
     Retorna:
         pd.DataFrame: DataFrame con los datos recuperados.
     """
+    import mysql.connector
+
     try:
         # Establecer conexión con la base de datos
         conexion = mysql.connector.connect(host=host, user=user, password=psw, database=db)
@@ -77,133 +248,1391 @@ def obtener_datos_df(host, user, psw, db, consulta):
         print(f"Error en la conexión a MySQL: {err}")
         df = None  # Retorna None en caso de error
     finally:
-        if 'conexion' in locals() and conexion.is_connected():
-            conexion.close()  # Cierra la conexión
-    return df
+        if 'conexion' in locals() and conexion.is_connected():
+            conexion.close()  # Cierra la conexión
+    return df
+
+# Pools de conexiones MySQL del proceso, uno por servidor/usuario/contraseña/base de datos/tamaño
+_pools = {}
+_pools_lock = threading.Lock()
+
+def obtener_conexion_pool(host, user, psw, db, pool_size=5):
+    """
+    Devuelve una conexión de un pool de conexiones MySQL. El pool se crea la primera vez que se pide una conexión
+    con esos parámetros (servidor, usuario, contraseña, base de datos y tamaño); una llamada con otra contraseña o
+    tamaño usa un pool distinto. Al cerrar la conexión esta vuelve al pool.
+
+    Parámetros:
+        host (str): Dirección del servidor MySQL.
+        user (str): Usuario de la base de datos.
+        psw (str): Contraseña del usuario.
+        db (str): Nombre de la base de datos.
+        pool_size (int): Número de conexiones del pool.
+
+    Retorna:
+        Conexión MySQL tomada del pool.
+    """
+    import mysql.connector.pooling
+
+    clave = (host, user, psw, db, pool_size)
+    with _pools_lock:
+        if clave not in _pools:
+            _pools[clave] = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=f"finanzas{len(_pools)}", pool_size=pool_size,
+                host=host, user=user, password=psw, database=db)
+    return _pools[clave].get_connection()
+
+
+class CacheMovimientos:
+    """
+    Cache de proceso para los movimientos clasificados que usa la aplicación web.
+
+    La primera consulta carga y clasifica todos los movimientos. Mientras no venza el 'ttl' se sirve el DataFrame
+    guardado; al vencer solo se leen y clasifican los movimientos nuevos. Con 'columna_id' (la clave autoincremental
+    de la tabla) se leen las filas con id mayor que el último cargado, lo que incluye las insertadas después con
+    fechas ya cargadas (p. ej. por cargar_bac.py). Sin ella se vuelve a leer desde la última fecha cargada, inclusive,
+    y las filas de esa fecha se reemplazan; las filas insertadas con fechas anteriores solo se ven tras invalidar().
+    invalidar() descarta la cache y obliga a una recarga completa en la siguiente consulta.
+
+    Parámetros:
+        obtener_conexion (callable): Devuelve una conexión DB-API nueva (p.ej. de obtener_conexion_pool o sqlite3).
+        consulta (str): Consulta SQL de los movimientos, sin filtro incremental.
+        categories (dict): Diccionario de categorías para clasificar transacciones.
+        ttl (float): Segundos durante los que se sirve la cache sin consultar la base de datos.
+        columna_fecha (str): Columna de la consulta usada para la actualización incremental sin 'columna_id'.
+        marcador (str): Marcador de parámetros del conector ('%s' en MySQL, '?' en SQLite).
+        excluir (tuple): Categorías que se eliminan del DataFrame servido.
+        compactar (bool): Si los movimientos se guardan con los tipos compactos de normalizar_movimientos.
+        columna_id (str): Columna de la consulta con la clave autoincremental de la tabla, o None.
+    """
+
+    def __init__(self, obtener_conexion, consulta, categories, ttl=300, columna_fecha='fecha_tran',
+                 columna_transaccion='transaccion', marcador='%s', excluir=("Otros gastos",), compactar=False,
+                 columna_id=None):
+        self.obtener_conexion = obtener_conexion
+        self.consulta = consulta.strip().rstrip(';')
+        self.categorias = compilar_categorias(categories)
+        self.ttl = ttl
+        self.columna_fecha = columna_fecha
+        self.columna_transaccion = columna_transaccion
+        self.marcador = marcador
+        self.excluir = list(excluir)
+        self.compactar = compactar
+        self.columna_id = columna_id
+        # Número de veces que han cambiado los datos servidos
+        self.version = 0
+        self._df = None
+        # Marca de agua: último id cargado, o última fecha y número de filas leídas con esa fecha
+        self._marca = None
+        self._filas_marca = 0
+        self._cargado = 0.0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        """
+        Devuelve el DataFrame de movimientos clasificados, actualizándolo si la cache ha vencido.
+
+        Raises:
+            Exception: El error de la base de datos si falla la carga completa (no hay datos anteriores que servir).
+        """
+        with self._lock:
+            if self._df is None:
+                self._actualizar(completa=True)
+            elif monotonic() - self._cargado > self.ttl:
+                self._actualizar(completa=False)
+            return self._df
+
+    def invalidar(self):
+        """Descarta los datos guardados; la siguiente consulta recarga todos los movimientos."""
+        with self._lock:
+            self._df = None
+            self._marca = None
+            self._filas_marca = 0
+
+    def _leer(self, desde=None):
+        """Ejecuta la consulta, opcionalmente solo para las filas a partir de la marca 'desde'."""
+        consulta, parametros = self.consulta, None
+        if desde is not None:
+            # Por id, las filas posteriores; por fecha, también las de la última fecha (pueden haber llegado más)
+            condicion = f"nuevos.{self.columna_id} >" if self.columna_id else f"nuevos.{self.columna_fecha} >="
+            consulta = f"SELECT * FROM ({self.consulta}) AS nuevos WHERE {condicion} {self.marcador}"
+            parametros = (desde,)
+        with etapa("sql_movimientos") as medida:
+            conexion = self.obtener_conexion()
+            try:
+                df = pd.read_sql(consulta, conexion, params=parametros)
+            finally:
+                conexion.close()  # Devuelve la conexión al pool
+            medida["filas"] = len(df)
+        return df
+
+    def _actualizar(self, completa):
+        """Carga todos los movimientos o solo los nuevos, y los clasifica."""
+        try:
+            nuevos = self._leer(None if completa else self._marca)
+        except Exception as err:
+            if completa:
+                raise
+            # Se siguen sirviendo los datos anteriores
+            print(f"Error al actualizar los movimientos: {err}")
+            return
+        self._cargado = monotonic()
+
+        anterior = self._df
+        if self.columna_id:
+            if not completa and nuevos.empty:
+                return
+            if not nuevos.empty:
+                # Entero de Python: los conectores no aceptan los enteros de NumPy como parámetro
+                maximo = int(nuevos[self.columna_id].max())
+                self._marca = maximo if self._marca is None else max(self._marca, maximo)
+        elif not nuevos.empty:
+            fecha = nuevos[self.columna_fecha].max()
+            filas_fecha = int((nuevos[self.columna_fecha] == fecha).sum())
+            # Releídas solo las filas ya cargadas de la última fecha: no hay cambios
+            if not completa and fecha == self._marca and filas_fecha == len(nuevos) == self._filas_marca:
+                return
+            if not completa:
+                # Las filas de la última fecha se reemplazan por las releídas
+                anterior = anterior[anterior[self.columna_fecha] < self._marca]
+            self._marca, self._filas_marca = fecha, filas_fecha
+        elif not completa:
+            return
+
+        # Clasificar solo las filas recién leídas
+        nuevos["categoria"] = clasificar_transacciones(nuevos[self.columna_transaccion].fillna(""), self.categorias)
+        nuevos = nuevos[~nuevos["categoria"].isin(self.excluir)]
+        if self.compactar:
+            # Categorías fijas para que los bloques incrementales se concatenen sin perder el tipo categórico
+            nuevos = normalizar_movimientos(nuevos, [categoria for categoria, _ in self.categorias])
+
+        self._df = nuevos.reset_index(drop=True) if completa else pd.concat([anterior, nuevos], ignore_index=True)
+        self.version += 1
+
+
+def top_subcategories(df, category, top_n=5, columna_categoria='categoria', columna_etiqueta='etiqueta', columna_valor='cargo'):
+    """
+    Filtra y agrupa datos por subcategorías dentro de una categoría específica y devuelve las (top_n) más relevantes.
+
+    Entradas:
+            df (pd.DataFrame): DataFrame que contiene los datos, ['Categoria', 'Etiqueta', 'Cargo'].
+                               Pueden ser movimientos o un agregado ya sumado, como CuboGastos.datos.
+            category (str)   : Categoría sobre la cual se agruparán los datos.
+            top_n (int)      : Número de subcategorías principales a devolver.
+            columna_categoria, columna_etiqueta, columna_valor (str): Nombres de las columnas de categoría,
+                               etiqueta y monto (por defecto 'categoria', 'etiqueta' y 'cargo').
+
+    Devuelve:
+            pd.DataFrame     : DataFrame filtrado con las principales subcategorías de la categoría seleccionada.
+
+    Raises:
+        ValueError: Si el argumento `df` no es un DataFrame.
+        ValueError: Si el argumento `category` no es una cadena de texto.
+        ValueError: Si el argumento `top_n` no es un número entero positivo.
+        ValueError: Si el DataFrame no contiene las columnas requeridas: ['Categoria', 'Etiqueta', 'Cargo'].
+        ValueError: Si no se encuentran datos para la categoría especificada en el DataFrame.
+
+    Ultima actualización:        8/4/2025          
+    Por:                 cemc (c)            
+    """
+    # Validar que 'df' sea un DataFrame
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError(f"El argumento 'df' debe ser un DataFrame, pero se recibió: {type(df)}")
+    
+    # Validar que 'category' sea una cadena de texto
+    if not isinstance(category, str):
+        raise ValueError(f"El argumento 'category' debe ser una cadena de texto, pero se recibió: {type(category)}")
+    
+    # Validar que 'top_n' sea un número entero positivo
+    if not isinstance(top_n, int) or top_n <= 0:
+        raise ValueError(f"El argumento 'top_n' debe ser un número entero positivo, pero se recibió: {top_n}")
+    
+    # Validar que las columnas requeridas existan en el DataFrame
+    required_columns = [columna_categoria, columna_etiqueta, columna_valor]
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"El DataFrame no contiene las columnas requeridas: {', '.join(missing_columns)}")
+    
+    # Filtrar datos por la categoría específica
+    filtered_df = df[df[columna_categoria] == category]
+    
+    # Validar que haya datos en la categoría filtrada
+    if filtered_df.empty:
+        raise ValueError(f"No se encontraron datos para la categoría: {category}")
+    
+    # Agrupar por etiquetas y calcular el total por subcategoría
+    subcategory_totals = filtered_df.groupby(columna_etiqueta, observed=True)[columna_valor].sum()
+    
+    # Obtener las subcategorías principales
+    top_subcategories = subcategory_totals.nlargest(top_n).index
+    
+    # Devolver el DataFrame filtrado con las principales subcategorías
+    return filtered_df[filtered_df[columna_etiqueta].isin(top_subcategories)]
+
+
+@instrumentar()
+def top_subcategories_all(df, top_n=5, columna_categoria='categoria', columna_etiqueta='etiqueta', columna_valor='cargo',
+                          agregado=False):
+    """
+    Versión de top_subcategories para todas las categorías a la vez: un solo groupby por (categoría, etiqueta) y un
+    rango por categoría (cumcount sobre los totales ordenados), en lugar de filtrar los datos una vez por categoría.
+    Las etiquetas elegidas son las mismas que da top_subcategories para cada categoría (nlargest, con los empates
+    resueltos por el orden de la etiqueta).
+
+    Entradas:
+            df (pd.DataFrame): DataFrame con las columnas de categoría, etiqueta y monto (movimientos o CuboGastos.datos).
+            top_n (int)      : Número de subcategorías principales por categoría.
+            columna_categoria, columna_etiqueta, columna_valor (str): Nombres de las columnas, como en top_subcategories.
+            agregado (bool)  : Si es True devuelve los totales por (categoría, etiqueta) en lugar de las filas.
+
+    Devuelve:
+            pd.DataFrame     : Las filas de 'df' de las principales subcategorías de cada categoría o, con
+                               agregado=True, sus totales ordenados por categoría y de mayor a menor.
+
+    Raises:
+        ValueError: Si el argumento `df` no es un DataFrame, `top_n` no es un entero positivo o faltan columnas.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError(f"El argumento 'df' debe ser un DataFrame, pero se recibió: {type(df)}")
+    if not isinstance(top_n, int) or top_n <= 0:
+        raise ValueError(f"El argumento 'top_n' debe ser un número entero positivo, pero se recibió: {top_n}")
+    required_columns = [columna_categoria, columna_etiqueta, columna_valor]
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"El DataFrame no contiene las columnas requeridas: {', '.join(missing_columns)}")
+
+    # Totales por (categoría, etiqueta), ordenados de mayor a menor dentro de cada categoría. El orden estable
+    # conserva el orden de las etiquetas en los empates, como nlargest(keep='first')
+    totales = df.groupby([columna_categoria, columna_etiqueta], observed=True)[columna_valor].sum().reset_index()
+    totales = totales.sort_values([columna_categoria, columna_valor], ascending=[True, False], kind='stable')
+    totales = totales[totales.groupby(columna_categoria, observed=True).cumcount() < top_n]
+    if agregado:
+        return totales.reset_index(drop=True)
+
+    principales = pd.MultiIndex.from_frame(totales[[columna_categoria, columna_etiqueta]])
+    return df[pd.MultiIndex.from_frame(df[[columna_categoria, columna_etiqueta]]).isin(principales)]
+
+
+def classify_transaction(transaction, categories):
+    """
+    Función para clasificar transacciones. Se clasifican las transacciones de las operaciones bancarias en diferntes categorias. 
+    Devuelve: Se incrementa el dataframe en una columna, con la clasificacion de la transaccion.
+    
+    Descripción: Dado la dispersion de las transacciones se hace necesario agruparlas en categorias, mediante un diccionario. 
+    Ultima revision: 30/3/2025
+    """
+
+    # Validar que 'categories' sea un diccionario
+    if not isinstance(categories, dict):
+        raise ValueError(f"El argumento 'categories' debe ser un diccionario, pero se recibió: {type(categories)}")
+    
+    # Verificar que el diccionario no esté vacío
+    if not categories:
+        raise ValueError("El diccionario 'categories' está vacío, no se pueden realizar clasificaciones.")
+        
+    # Verificar que el argumento 'transaction' sea válido
+    if not isinstance(transaction, str):
+        raise ValueError(f"La transacción debe ser una cadena de texto, pero se recibió: {type(transaction)}")
+    
+    # Asegurar que 'transaction' no esté vacía
+    if not transaction.strip():
+        return "Otros gastos"
+
+    # Convertir la transacción a mayúsculas para evitar errores de comparación
+    transaction = transaction.upper()
+
+    # Proceso de clasificación
+    for category, keywords in categories.items():
+        if any(keyword in transaction for keyword in keywords):
+            return category
+    
+    # Categoría por defecto si no hay coincidencias
+    return "Otros gastos"
+
+
+def compilar_categorias(categories):
+    """
+    Compila el diccionario de categorías en una lista reutilizable de patrones, uno por categoría.
+
+    Entradas:
+            categories (dict): Diccionario {categoria: [palabras clave]}, el mismo que usa classify_transaction.
+
+    Devuelve:
+            list: Pares (categoria, patron) en el orden del diccionario. El patrón es una única expresión regular
+                  con todas las palabras clave de la categoría, o None si la categoría no tiene palabras clave.
+
+    Raises:
+        ValueError: Si 'categories' no es un diccionario o está vacío.
+    """
+    # Validar que 'categories' sea un diccionario
+    if not isinstance(categories, dict):
+        raise ValueError(f"El argumento 'categories' debe ser un diccionario, pero se recibió: {type(categories)}")
+
+    # Verificar que el diccionario no esté vacío
+    if not categories:
+        raise ValueError("El diccionario 'categories' está vacío, no se pueden realizar clasificaciones.")
+
+    # Las palabras clave se escapan, se buscan como texto literal igual que con 'in'
+    return [(category, re.compile("|".join(re.escape(keyword) for keyword in keywords)) if keywords else None)
+            for category, keywords in categories.items()]
+
+
+@instrumentar()
+def clasificar_transacciones(transacciones, categories):
+    """
+    Clasifica una columna completa de transacciones en una sola pasada vectorizada.
+
+    Devuelve exactamente las mismas etiquetas que aplicar classify_transaction fila por fila: gana la primera
+    categoría del diccionario con alguna coincidencia y las transacciones vacías o sin coincidencias quedan en
+    "Otros gastos". Las descripciones se repiten mucho, de modo que solo se clasifican las transacciones distintas
+    (pd.factorize) y el resultado se reparte a cada fila por su código; cada categoría solo se busca sobre las
+    transacciones distintas que aún no se han clasificado.
+
+    Entradas:
+            transacciones (pd.Series): Descripciones de las transacciones.
+            categories (dict | list):  Diccionario de categorías o su versión ya compilada con compilar_categorias.
+
+    Devuelve:
+            pd.Series: Categoría de cada transacción, con el mismo índice de la entrada.
+
+    Raises:
+        ValueError: Si 'categories' no es válido o alguna transacción no es una cadena de texto.
+    """
+    compiladas = categories if isinstance(categories, list) else compilar_categorias(categories)
+
+    transacciones = pd.Series(transacciones)
+    codigos, unicas = pd.factorize(transacciones)
+    unicas = pd.Series(unicas, dtype=object)
+    # Verificar que todas las transacciones sean cadenas de texto (los nulos quedan con código -1)
+    if (codigos == -1).any() or pd.api.types.infer_dtype(unicas, skipna=False) not in ("string", "empty"):
+        raise ValueError("Todas las transacciones deben ser cadenas de texto.")
+
+    # Convertir a mayúsculas una sola vez por transacción distinta
+    texto = unicas.str.upper().to_numpy(dtype=object)
+    categorias = np.full(len(texto), "Otros gastos", dtype=object)
+
+    # Las transacciones vacías se quedan en "Otros gastos"
+    pendientes = (unicas.str.strip() != "").to_numpy(dtype=bool, copy=True)
+
+    # Proceso de clasificación, respetando el orden del diccionario
+    for category, patron in compiladas:
+        if patron is None:
+            continue
+        posiciones = np.flatnonzero(pendientes)
+        if not len(posiciones):
+            break
+        coincide = pd.Series(texto[posiciones], dtype=object).str.contains(patron).to_numpy(dtype=bool)
+        categorias[posiciones[coincide]] = category
+        pendientes[posiciones[coincide]] = False
+
+    resultado = categorias[codigos]
+    return pd.Series(resultado, index=transacciones.index, name=transacciones.name)
+
+
+# SQL propio de cada motor: marcador de parámetros, tabla nueva, expresión del año (la misma en la consulta y en el
+# índice, para aprovecharlo), índices existentes y las comparaciones de categorias_sql. 'vacia' equivale a
+# not texto.strip() (espacios, tabuladores y saltos de línea) y 'contiene' a 'keyword in texto.upper()': en MySQL
+# con intercalación binaria, porque la predeterminada (utf8mb4_0900_ai_ci) no distingue acentos ('CAFÉ' contendría
+# 'CAFE'), tras convertir a utf8mb4 para que valga también con columnas latin1 o utf8mb3; en SQLite con INSTR, que
+# distingue mayúsculas, aunque UPPER() de SQLite solo convierte letras ASCII ('café' no contiene 'CAFÉ', a
+# diferencia de Python).
+DIALECTOS_SQL = {
+    'mysql': {
+        'marcador': '%s',
+        'tabla':    ("CREATE TABLE IF NOT EXISTS {tabla} (id INT AUTO_INCREMENT PRIMARY KEY, fecha_tran DATE, "
+                     "transaccion VARCHAR(255), cargo DECIMAL(12,2), abono DECIMAL(12,2))"),
+        'anio':     'YEAR({})',
+        'indices':  ("SELECT DISTINCT index_name FROM information_schema.statistics "
+                     "WHERE table_schema = DATABASE() AND table_name = '{tabla}'"),
+        'columnas': ("SELECT column_name FROM information_schema.columns "
+                     "WHERE table_schema = DATABASE() AND table_name = '{tabla}'"),
+        'agregar_id': "ALTER TABLE {tabla} ADD COLUMN id INT AUTO_INCREMENT PRIMARY KEY FIRST",
+        'vacia':    "{columna} REGEXP '^[[:space:]]*$'",
+        'contiene': "UPPER(CONVERT({columna} USING utf8mb4)) COLLATE utf8mb4_bin LIKE {patron} ESCAPE '!'",
+    },
+    'sqlite': {
+        'marcador': '?',
+        'tabla':    ("CREATE TABLE IF NOT EXISTS {tabla} (id INTEGER PRIMARY KEY, fecha_tran TEXT, transaccion TEXT, "
+                     "cargo REAL, abono REAL)"),
+        'anio':     "CAST(strftime('%Y', {}) AS INTEGER)",
+        'indices':  "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = '{tabla}'",
+        'columnas': "SELECT name FROM pragma_table_info('{tabla}')",
+        # SQLite no permite añadir una clave primaria a una tabla existente
+        'agregar_id': None,
+        'vacia':    "TRIM({columna}, ' ' || char(9) || char(10) || char(11) || char(12) || char(13)) = ''",
+        'contiene': "INSTR(UPPER({columna}), {texto}) > 0",
+    },
+}
+
+
+def categorias_sql(categories, columna='transaccion', dialecto='mysql'):
+    """
+    Compila el diccionario de categorías en una expresión SQL CASE WHEN ... LIKE ..., equivalente a
+    classify_transaction, para clasificar las transacciones dentro de la base de datos (ver DIALECTOS_SQL).
+
+    Entradas:
+            categories (dict): Diccionario {categoria: [palabras clave]}.
+            columna (str):     Columna o expresión SQL con la descripción de la transacción.
+            dialecto (str):    'mysql' o 'sqlite'.
+
+    Devuelve:
+            str: Expresión CASE que devuelve la categoría de cada fila ('Otros gastos' si no hay coincidencias).
+
+    Raises:
+        ValueError: Si 'categories' no es un diccionario o está vacío.
+    """
+    def literal(texto):
+        return "'" + texto.replace("'", "''") + "'"
+
+    def patron(keyword):
+        # Se escapan los comodines de LIKE con '!' para buscar la palabra clave como texto literal
+        keyword = keyword.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+        return literal('%' + keyword + '%')
+
+    sql = DIALECTOS_SQL[dialecto]
+    casos = []
+    for category, patron_categoria in compilar_categorias(categories):
+        if patron_categoria is None:
+            continue
+        condicion = " OR ".join(sql['contiene'].format(columna=columna, patron=patron(keyword), texto=literal(keyword))
+                                for keyword in categories[category])
+        casos.append(f"WHEN {condicion} THEN {literal(category)}")
+
+    # Las transacciones vacías se quedan en "Otros gastos", igual que en classify_transaction
+    return (f"CASE WHEN {columna} IS NULL OR {sql['vacia'].format(columna=columna)} THEN 'Otros gastos' "
+            + " ".join(casos) + " ELSE 'Otros gastos' END")
+
+
+def consulta_agregada(categories, tabla='movimientos', columna_fecha='fecha_tran', columna_transaccion='transaccion',
+                      expresion_anio=None, desde=2016, excluir=("Otros gastos",), dialecto='mysql'):
+    """
+    Construye la consulta SQL que clasifica y agrega los movimientos por año y categoría dentro de la base de datos,
+    de modo que solo el resultado agregado viaja hasta Python.
+
+    Entradas:
+            categories (dict):         Diccionario de categorías para clasificar transacciones.
+            tabla (str):               Tabla de movimientos.
+            columna_fecha (str):       Columna con la fecha de la transacción.
+            columna_transaccion (str): Columna con la descripción de la transacción.
+            expresion_anio (str):      Expresión SQL del año, '{}' se reemplaza por la columna de fecha; por
+                                       defecto la del dialecto (p.ej. "CAST(strftime('%Y', {}) AS INTEGER)" en SQLite).
+            desde (int):               Primer año incluido.
+            excluir (tuple):           Categorías que no se devuelven.
+            dialecto (str):            'mysql' o 'sqlite' (ver DIALECTOS_SQL).
+
+    Devuelve:
+            str: Consulta con columnas 'año', 'categoria', 'cargo' y 'abono'.
+    """
+    expresion_anio = expresion_anio or DIALECTOS_SQL[dialecto]['anio']
+    excluidas = ", ".join("'" + category.replace("'", "''") + "'" for category in excluir)
+    return f"""
+        SELECT {expresion_anio.format(columna_fecha)} AS año,
+               {categorias_sql(categories, columna_transaccion, dialecto)} AS categoria,
+               COALESCE(SUM(cargo), 0) AS cargo,
+               COALESCE(SUM(abono), 0) AS abono
+        FROM {tabla}
+        WHERE {columna_fecha} IS NOT NULL AND {columna_fecha} >= '{desde}-01-01'
+        GROUP BY año, categoria
+        {f"HAVING categoria NOT IN ({excluidas})" if excluidas else ""}
+    """
+
+
+@instrumentar()
+def obtener_agregado_sql(obtener_conexion, categories, **opciones):
+    """
+    Ejecuta consulta_agregada y devuelve los totales por año y categoría.
+
+    Parámetros:
+        obtener_conexion (callable): Devuelve una conexión DB-API nueva.
+        categories (dict): Diccionario de categorías para clasificar transacciones.
+        **opciones: Argumentos adicionales de consulta_agregada.
+
+    Retorna:
+        pd.DataFrame: Columnas 'año', 'categoria', 'cargo' y 'abono', o None en caso de error.
+    """
+    try:
+        conexion = obtener_conexion()
+        try:
+            df = pd.read_sql(consulta_agregada(categories, **opciones), conexion)
+        finally:
+            conexion.close()
+    except Exception as err:
+        print(f"Error al obtener el agregado por año y categoría: {err}")
+        return None
+
+    # MySQL devuelve SUM() como Decimal, se convierte a números de pandas
+    df["año"] = df["año"].astype(int)
+    df[["cargo", "abono"]] = df[["cargo", "abono"]].astype(float)
+    return df
+
+
+# Columnas de la tabla de movimientos que escribe cargar_movimientos (las que lee bac_web.py)
+COLUMNAS_MOVIMIENTOS = ['fecha_tran', 'transaccion', 'cargo', 'abono']
+
+
+def huellas_movimientos(df):
+    """
+    Calcula una huella por movimiento (entero de 64 bits de pd.util.hash_pandas_object, vectorizado) a partir de la
+    fecha, la transacción, el cargo y el abono, más el número de aparición de esa misma combinación en 'df'. Así dos
+    compras idénticas del mismo día son movimientos distintos, y volver a cargar un estado de cuenta que se solapa
+    con uno anterior produce las mismas huellas para las filas repetidas. Las huellas solo se comparan dentro de una
+    misma ejecución (no se guardan en la base de datos).
+
+    Parámetros:
+        df (pd.DataFrame): Movimientos con las columnas 'fecha_tran', 'transaccion', 'cargo' y 'abono', tal como
+                           vienen del CSV o de la base de datos (fechas como texto o date, montos como Decimal, ...).
+
+    Retorna:
+        pd.Series: Huella de cada fila, con el índice de 'df'.
+    """
+    # Montos en centavos; un monto vacío cuenta como 0, igual que en las sumas
+    claves = pd.DataFrame({
+        'fecha': pd.to_datetime(df['fecha_tran'], errors='coerce').dt.normalize(),
+        'texto': df['transaccion'].fillna('').astype(str).str.strip(),
+        'cargo': (pd.to_numeric(df['cargo'], errors='coerce').fillna(0) * 100).round().astype('int64'),
+        'abono': (pd.to_numeric(df['abono'], errors='coerce').fillna(0) * 100).round().astype('int64'),
+    })
+    claves['aparicion'] = claves.groupby(list(claves.columns), dropna=False, sort=False).cumcount()
+    return pd.Series(pd.util.hash_pandas_object(claves, index=False).to_numpy(), index=df.index)
+
+
+def preparar_tabla_movimientos(conexion, tabla='movimientos', dialecto='mysql'):
+    """
+    Crea la tabla de movimientos si no existe y los índices que usa el tablero (bac_web.py): uno sobre 'fecha_tran',
+    para los filtros por rango de fechas, y otro sobre la expresión del año, para el GROUP BY por año de
+    consulta_agregada (en MySQL requiere la versión 8.0.13 o posterior). No modifica las columnas de una tabla
+    existente (ver migrar_tabla_movimientos).
+
+    Parámetros:
+        conexion: Conexión DB-API abierta.
+        tabla (str): Nombre de la tabla.
+        dialecto (str): 'mysql' o 'sqlite' (ver DIALECTOS_SQL).
+
+    Retorna:
+        list: Nombres de los índices creados (vacía si ya existían).
+    """
+    sql = DIALECTOS_SQL[dialecto]
+    # Las expresiones van entre paréntesis (índice funcional en MySQL); las columnas, sin ellos
+    indices = {f'idx_{tabla}_fecha': 'fecha_tran',
+               f'idx_{tabla}_anio': '(' + sql['anio'].format('fecha_tran') + ')'}
+
+    cursor = conexion.cursor()
+    try:
+        cursor.execute(sql['tabla'].format(tabla=tabla))
+        cursor.execute(sql['indices'].format(tabla=tabla))
+        existentes = {nombre.lower() for nombre, in cursor.fetchall()}
+        creados = []
+        for nombre, expresion in indices.items():
+            if nombre.lower() in existentes:
+                continue
+            try:
+                cursor.execute(f"CREATE INDEX {nombre} ON {tabla} ({expresion})")
+                creados.append(nombre)
+            except Exception as err:
+                # Índice sobre expresiones no soportado por el servidor: la carga continúa sin él
+                print(f"No se pudo crear el índice {nombre}: {err}")
+        conexion.commit()
+    finally:
+        cursor.close()
+    return creados
+
+
+def columnas_tabla(conexion, tabla='movimientos', dialecto='mysql'):
+    """
+    Devuelve los nombres (en minúsculas) de las columnas de una tabla, o un conjunto vacío si no existe.
+
+    Parámetros:
+        conexion: Conexión DB-API abierta.
+        tabla (str): Nombre de la tabla.
+        dialecto (str): 'mysql' o 'sqlite' (ver DIALECTOS_SQL).
+
+    Retorna:
+        set: Nombres de las columnas.
+    """
+    cursor = conexion.cursor()
+    try:
+        cursor.execute(DIALECTOS_SQL[dialecto]['columnas'].format(tabla=tabla))
+        return {nombre.lower() for nombre, in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def migrar_tabla_movimientos(conexion, tabla='movimientos', dialecto='mysql'):
+    """
+    Migración única (cargar_bac.py --migrar): añade la clave autoincremental 'id' a una tabla de movimientos creada
+    sin ella, para que CacheMovimientos lea las filas nuevas por id y vea también las insertadas con fechas ya
+    cargadas. Las tablas creadas por preparar_tabla_movimientos ya la tienen. No se ejecuta en las cargas normales.
+
+    Parámetros:
+        conexion: Conexión DB-API abierta.
+        tabla (str): Nombre de la tabla.
+        dialecto (str): 'mysql' o 'sqlite' (ver DIALECTOS_SQL).
+
+    Retorna:
+        bool: True si se añadió la columna, False si ya existía o la tabla no existe (se creará con ella).
+
+    Raises:
+        ValueError: Si el motor no permite añadir la clave (SQLite).
+        Exception: El error de la base de datos si falla el ALTER TABLE (p. ej. la tabla ya tiene otra clave
+                   primaria); la tabla queda sin cambios.
+    """
+    sql = DIALECTOS_SQL[dialecto]
+    columnas = columnas_tabla(conexion, tabla, dialecto)
+    if not columnas or 'id' in columnas:
+        return False
+    if sql['agregar_id'] is None:
+        raise ValueError(f"{dialecto} no permite añadir una clave primaria a '{tabla}'; hay que recrear la tabla.")
+
+    cursor = conexion.cursor()
+    try:
+        cursor.execute(sql['agregar_id'].format(tabla=tabla))
+        conexion.commit()
+    finally:
+        cursor.close()
+    return True
+
+
+@instrumentar()
+def cargar_movimientos(obtener_conexion, df, tabla='movimientos', dialecto='mysql', tamano_lote=10_000):
+    """
+    Carga en la base de datos los movimientos de un estado de cuenta que aún no están en ella.
+
+    Se leen de la tabla solo los movimientos del rango de fechas de 'df' (consulta por rango sobre el índice de
+    'fecha_tran'), se comparan sus huellas con las de 'df' (huellas_movimientos) y las filas nuevas se insertan con
+    executemany en lotes de 'tamano_lote' filas, dentro de una sola transacción. Las filas sin fecha válida se
+    descartan.
+
+    Parámetros:
+        obtener_conexion (callable): Devuelve una conexión DB-API nueva (p.ej. de obtener_conexion_pool o sqlite3).
+        df (pd.DataFrame): Movimientos de un estado de cuenta, con las columnas 'fecha_tran' (datetime, o texto con
+                           el día primero), 'transaccion', 'cargo' y 'abono'. Cada archivo exportado debe cargarse por separado, para que el número de
+                           aparición de los movimientos idénticos se cuente dentro de cada archivo.
+        tabla (str): Tabla de movimientos; se crea, junto con sus índices, si no existe.
+        dialecto (str): 'mysql' o 'sqlite' (ver DIALECTOS_SQL).
+        tamano_lote (int): Filas de cada executemany.
+
+    Retorna:
+        dict: 'leidas', 'descartadas' (sin fecha), 'duplicadas', 'insertadas', 'indices' (creados), 'segundos',
+              'leidas_por_segundo' e 'insertadas_por_segundo' (sobre el tiempo total, incluida la comparación con
+              la base de datos).
+    """
+    inicio = perf_counter()
+    marcador = DIALECTOS_SQL[dialecto]['marcador']
+
+    movimientos = _limpiar_tipos(df[COLUMNAS_MOVIMIENTOS].copy(), fechas=['fecha_tran'])
+    validos = movimientos['fecha_tran'].notna()
+    movimientos = movimientos[validos]
+    resultado = {'leidas': len(df), 'descartadas': int((~validos).sum()), 'duplicadas': 0, 'insertadas': 0,
+                 'indices': []}
+
+    conexion = obtener_conexion()
+    try:
+        resultado['indices'] = preparar_tabla_movimientos(conexion, tabla, dialecto)
+        if not movimientos.empty:
+            desde, hasta = (fecha.strftime('%Y-%m-%d') for fecha in movimientos['fecha_tran'].agg(['min', 'max']))
+            with etapa("sql_movimientos_existentes") as medida:
+                existentes = pd.read_sql(f"SELECT {', '.join(COLUMNAS_MOVIMIENTOS)} FROM {tabla} "
+                                         f"WHERE fecha_tran >= {marcador} AND fecha_tran <= {marcador}",
+                                         conexion, params=(desde, hasta))
+                medida["filas"] = len(existentes)
+
+            nuevas = ~huellas_movimientos(movimientos).isin(huellas_movimientos(existentes))
+            resultado['duplicadas'] = int((~nuevas).sum())
+            movimientos = movimientos[nuevas]
+
+        # Valores de Python (None para los vacíos) para el conector
+        movimientos = movimientos.assign(fecha_tran=movimientos['fecha_tran'].dt.strftime('%Y-%m-%d'))
+        filas = list(movimientos.astype(object).where(movimientos.notna(), None).itertuples(index=False, name=None))
+        insertar = (f"INSERT INTO {tabla} ({', '.join(COLUMNAS_MOVIMIENTOS)}) "
+                    f"VALUES ({', '.join([marcador] * len(COLUMNAS_MOVIMIENTOS))})")
+        cursor = conexion.cursor()
+        try:
+            with etapa("sql_insertar_movimientos", filas=len(filas)):
+                for i in range(0, len(filas), tamano_lote):
+                    cursor.executemany(insertar, filas[i:i + tamano_lote])
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+        resultado['insertadas'] = len(filas)
+    finally:
+        conexion.close()
+
+    resultado['segundos'] = segundos = perf_counter() - inicio
+    resultado['leidas_por_segundo'] = resultado['leidas'] / segundos if segundos else 0.0
+    resultado['insertadas_por_segundo'] = resultado['insertadas'] / segundos if segundos else 0.0
+    return resultado
+
+
+def extract_label(transaction):
+    """
+    Extrae una etiqueta de una transacción basada en su formato.
+
+    Args:
+        transaction (str): Descripción de la transacción.
+
+    Returns:
+        str: Etiqueta extraída de la transacción o 'OTHER' si no se encuentra un formato esperado.
+    """
+    # Validar que 'transaction' sea una cadena de texto
+    if not isinstance(transaction, str):
+        raise ValueError(f"La transacción debe ser una cadena de texto, pero se recibió: {type(transaction)}")
+
+    # Asegurar que 'transaction' no esté vacía
+    if not transaction.strip():
+        return 'OTHER'
+
+    # Extraer etiqueta si existe el carácter ':'
+    if ':' in transaction:
+        return transaction.split(':')[0] + ':'
+    
+    # Etiqueta por defecto
+    return 'OTHER'
+
+
+@instrumentar()
+def extraer_etiquetas(transacciones, categorias=None):
+    """
+    Extrae las etiquetas de una columna completa de transacciones, equivalente a aplicar extract_label fila por fila.
+    Solo se procesan las transacciones distintas (pd.factorize) y el resultado se arma con sus códigos, sin crear
+    cadenas por fila.
+
+    Args:
+        transacciones (pd.Series): Descripciones de las transacciones.
+        categorias (list): Categorías fijas del resultado, para que los bloques de un mismo archivo compartan las
+                           categorías y se concatenen sin perder el tipo; las etiquetas que no estén se añaden al
+                           final, ordenadas. Por defecto, las etiquetas encontradas, ordenadas.
+
+    Returns:
+        pd.Categorical: Etiquetas extraídas, 'OTHER' cuando la transacción no contiene el carácter ':'.
+
+    Raises:
+        ValueError: Si alguna transacción no es una cadena de texto.
+    """
+    codigos, unicas = pd.factorize(pd.Series(transacciones))
+    unicas = pd.Series(unicas, dtype=object)
+    # Validar que todas las transacciones sean cadenas de texto (los nulos quedan con código -1)
+    if (codigos == -1).any() or pd.api.types.infer_dtype(unicas, skipna=False) not in ("string", "empty"):
+        raise ValueError("Todas las transacciones deben ser cadenas de texto.")
+
+    # Separar por el primer ':' (las transacciones vacías nunca lo contienen)
+    if unicas.empty:
+        etiquetas = unicas
+    else:
+        partes = unicas.str.partition(':')
+        etiquetas = (partes[0] + ':').where(partes[1] == ':', 'OTHER')
+
+    nuevas = sorted(set(etiquetas) - set(categorias or ()))
+    etiquetas = pd.Categorical(etiquetas, categories=list(categorias or ()) + nuevas)
+    return pd.Categorical.from_codes(etiquetas.codes[codigos], etiquetas.categories)
+
+
+# Tipo compacto de cada columna de los movimientos bancarios, por nombre en minúsculas (bac.py usa 'Categoria',
+# 'Año', ...; bac_web.py 'categoria', 'año', ...)
+ESQUEMA_MOVIMIENTOS = {
+    'transaccion': 'texto',      # cadenas Arrow (o categoría si pyarrow no está instalado)
+    'categoria':   'categoria',
+    'etiqueta':    'categoria',
+    'año':         'int16',
+    'mes':         'int8',
+    'cargo':       'monto',      # float64, o centavos enteros (Int64) con centavos=True
+    'abono':       'monto',
+}
+
+
+def memoria_df(df):
+    """Memoria ocupada por un DataFrame en bytes, incluyendo el contenido de las cadenas."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def normalizar_movimientos(df, categories=None, centavos=False, informe=False):
+    """
+    Convierte las columnas de un DataFrame de movimientos bancarios a los tipos compactos de ESQUEMA_MOVIMIENTOS:
+    categoría y etiqueta como categóricas, año int16, mes int8, la descripción como cadenas Arrow y, opcionalmente,
+    cargo y abono como centavos enteros. Las columnas que no están en el esquema se dejan como están.
+
+    Parámetros:
+        df (pd.DataFrame): Movimientos, con nombres de columna como en bac.py o en bac_web.py.
+        categories (dict): Diccionario de categorías (o lista de sus nombres); si se indica, fija las categorías
+                           de la columna de categoría, de modo que varios bloques normalizados se pueden concatenar sin perderlas.
+        centavos (bool): Si cargo y abono se guardan como centavos en Int64 (entero con nulos). Las sumas son
+                         entonces exactas, sin la deriva de sumar float64; para volver a dólares se divide por 100.
+        informe (bool): Si además se devuelve la memoria antes y después de la conversión.
+
+    Retorna:
+        pd.DataFrame: Copia con los tipos compactos o, con informe=True, la tupla (DataFrame, dict) con
+                      'bytes_antes', 'bytes_despues' y 'ahorro' (fracción de memoria ahorrada).
+
+    Raises:
+        ValueError: Si el año o el mes están fuera de rango, o hay categorías que no están en 'categories'.
+    """
+    antes = memoria_df(df) if informe else None
+    df = df.copy()
+
+    for columna in df.columns:
+        tipo = ESQUEMA_MOVIMIENTOS.get(str(columna).lower())
+        valores = df[columna]
+
+        if tipo == 'texto':
+            try:
+                import pyarrow  # noqa: F401
+                df[columna] = valores.astype(pd.StringDtype('pyarrow'))
+            except ImportError:
+                df[columna] = valores.astype('category')
+
+        elif tipo == 'categoria':
+            if categories is not None and str(columna).lower() == 'categoria':
+                desconocidas = set(valores.dropna().unique()) - set(categories)
+                if desconocidas:
+                    raise ValueError(f"Categorías que no están en 'categories': {sorted(desconocidas)}")
+                df[columna] = pd.Categorical(valores, categories=list(categories))
+            else:
+                df[columna] = valores.astype('category')
+
+        elif tipo in ('int16', 'int8'):
+            limites = (1900, 2200) if tipo == 'int16' else (1, 12)
+            fuera = valores.notna() & ~valores.between(*limites)
+            if fuera.any():
+                raise ValueError(f"La columna '{columna}' tiene valores fuera de {limites}: {valores[fuera].unique()[:5]}")
+            # Entero con nulos solo si hay valores faltantes (p. ej. fechas inválidas)
+            df[columna] = valores.astype(tipo if valores.notna().all() else tipo.capitalize())
+
+        elif tipo == 'monto':
+            valores = pd.to_numeric(valores).astype('float64')
+            df[columna] = (valores * 100).round().astype('Int64') if centavos else valores
+
+    if not informe:
+        return df
+    despues = memoria_df(df)
+    return df, {'bytes_antes': antes, 'bytes_despues': despues, 'ahorro': 1 - despues / antes if antes else 0.0}
+
+
+def _a_numero(valores, columna):
+    """
+    Convierte una columna a float64 como read_csv(thousands=','): en las celdas de texto ('1,200.50') se quita el
+    separador de miles antes de pd.to_numeric. Los valores que aun así no son números quedan como NaN y se informa
+    cuántos son, para que un monto ilegible no desaparezca sin aviso.
+    """
+    if valores.dtype == object:
+        # .str da NaN en las celdas que no son texto; esas conservan su valor
+        valores = valores.str.replace(',', '', regex=False).fillna(valores)
+    numeros = pd.to_numeric(valores, errors='coerce').astype('float64')
+    invalidos = int((numeros.isna() & valores.notna()).sum())
+    if invalidos:
+        print(f"{columna}: {invalidos} valores no numéricos, tomados como vacíos")
+    return numeros
+
+
+def _limpiar_tipos(df, fechas=(), numericas=()):
+    """Aplica la limpieza de tipos habitual de los archivos exportados: fechas con día primero y columnas numéricas."""
+    for columna in fechas:
+        if not pd.api.types.is_datetime64_any_dtype(df[columna]):
+            df[columna] = pd.to_datetime(df[columna], dayfirst=True, errors='coerce')
+    # Convertir con manejo de errores: los valores inválidos quedan en 0, evitando fallos (ver _a_numero)
+    for columna in numericas:
+        df[columna] = _a_numero(df[columna], columna).fillna(0)
+    return df
+
+
+# Extensiones de los libros de Excel que se leen con leer_excel / leer_excel_por_bloques
+EXTENSIONES_EXCEL = ('.xls', '.xlsx', '.xlsm')
+
+
+def es_excel(ruta):
+    """Indica si 'ruta' es un libro de Excel (por su extensión)."""
+    return os.path.splitext(ruta)[1].lower() in EXTENSIONES_EXCEL
+
+
+def _valores_xlrd(fila, modo_fecha):
+    """Valores de una fila de xlrd, con las celdas de fecha convertidas a datetime y las vacías a None."""
+    import xlrd
+    valores = []
+    for celda in fila:
+        if celda.ctype == xlrd.XL_CELL_DATE:
+            valores.append(xlrd.xldate_as_datetime(celda.value, modo_fecha))
+        elif celda.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+            valores.append(None)
+        else:
+            valores.append(celda.value)
+    return tuple(valores)
+
+
+def _hojas_excel(ruta, hojas=None, motor=None):
+    """
+    Recorre las hojas de un libro de Excel y devuelve, para cada una, su nombre y un iterador de filas (tuplas de
+    valores). El libro se cierra al terminar el recorrido. Motores:
+        'openpyxl': por defecto para .xlsx; en modo de solo lectura lee las filas del XML a medida que se piden, de
+                    modo que la memoria no depende del tamaño de la hoja.
+        'calamine': python-calamine, por defecto para .xls si está instalado; mucho más rápido, pero carga cada
+                    hoja completa en memoria antes de devolver la primera fila.
+        'xlrd':     .xls sin python-calamine; también carga la hoja completa (el formato admite hasta 65536 filas).
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if motor is None:
+        if extension != '.xls':
+            motor = 'openpyxl'
+        else:
+            try:
+                import python_calamine
+                motor = 'calamine'
+            except ImportError:
+                motor = 'xlrd'
+
+    if motor == 'calamine':
+        from python_calamine import CalamineWorkbook
+        libro = CalamineWorkbook.from_path(ruta)
+        try:
+            for nombre in hojas or libro.sheet_names:
+                yield nombre, libro.get_sheet_by_name(nombre).iter_rows()
+        finally:
+            libro.close()
+
+    elif motor == 'xlrd':
+        import xlrd
+        libro = xlrd.open_workbook(ruta, on_demand=True)
+        try:
+            for nombre in hojas or libro.sheet_names():
+                hoja = libro.sheet_by_name(nombre)
+                yield nombre, (_valores_xlrd(fila, libro.datemode) for fila in hoja.get_rows())
+                libro.unload_sheet(nombre)
+        finally:
+            libro.release_resources()
+
+    elif motor == 'openpyxl':
+        import openpyxl
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            for nombre in hojas or libro.sheetnames:
+                yield nombre, libro[nombre].iter_rows(values_only=True)
+        finally:
+            libro.close()
+
+    else:
+        raise ValueError(f"El motor debe ser 'openpyxl', 'calamine' o 'xlrd', pero se recibió: {motor}")
+
+
+def leer_excel_por_bloques(ruta, hojas=None, tamano_bloque=100_000, fechas=(), numericas=(), encabezado=0,
+                           columna_hoja=None, montos=(), motor=None):
+    """
+    Lee las hojas de un libro de Excel (.xls, .xlsx) por bloques de 'tamano_bloque' filas, con la limpieza de tipos
+    habitual de los archivos exportados (ver _limpiar_tipos). En los .xlsx (openpyxl, por defecto) las filas se
+    leen a medida que se necesitan, de modo que un libro grande no se carga completo en memoria; los .xls y el motor
+    'calamine' cargan cada hoja completa (ver _hojas_excel).
+
+    Entradas:
+            ruta (str):           Ruta del libro.
+            hojas (list):         Nombres de las hojas a leer; por defecto todas, en orden.
+            tamano_bloque (int):  Número de filas de cada bloque.
+            fechas (list):        Columnas de fecha; las que vienen como texto se interpretan con el día primero.
+            numericas (list):     Columnas numéricas; los valores inválidos se convierten en 0 (y se informan).
+            encabezado (int):     Filas a saltar antes de la fila con los nombres de las columnas.
+            columna_hoja (str):   Si se indica, columna donde se guarda el nombre de la hoja de cada fila.
+            montos (list):        Columnas que se convierten a número, dejando los vacíos como NaN, igual que
+                                  read_csv(thousands=',') con los montos de los CSV; los textos con separador de
+                                  miles ('1,200.50') se convierten y los inválidos se informan (ver _a_numero).
+            motor (str):          'openpyxl', 'calamine' o 'xlrd'; por defecto según la extensión.
+
+    Devuelve:
+            Generador de DataFrames, uno por bloque; las filas completamente vacías se descartan.
+    """
+    inicio = 0
+    for nombre, filas in _hojas_excel(ruta, hojas, motor):
+        filas = iter(filas)
+        for _ in range(encabezado):
+            next(filas, None)
+        columnas = next(filas, None)
+        if columnas is None:
+            continue
+        columnas = [f'Unnamed: {i}' if columna in (None, '') else str(columna) for i, columna in enumerate(columnas)]
+
+        while True:
+            lote = list(islice(filas, tamano_bloque))
+            if not lote:
+                break
+            # Las filas pueden traer más o menos celdas que el encabezado
+            bloque = pd.DataFrame(lote).reindex(columns=range(len(columnas)))
+            bloque.columns = columnas
+            # python-calamine devuelve '' en las celdas vacías; openpyxl, enteros y decimales mezclados (object)
+            bloque = bloque.where(bloque.ne('')).dropna(how='all').infer_objects()
+            if bloque.empty:
+                continue
+            for columna in montos:
+                bloque[columna] = _a_numero(bloque[columna], columna)
+            bloque.index = pd.RangeIndex(inicio, inicio + len(bloque))
+            inicio += len(bloque)
+            if columna_hoja:
+                bloque[columna_hoja] = nombre
+            yield _limpiar_tipos(bloque, fechas, numericas)
+
+
+@instrumentar()
+def leer_excel(ruta, hojas=None, fechas=(), numericas=(), encabezado=0, columna_hoja=None, montos=(), motor=None):
+    """
+    Lee un libro de Excel completo (todas las hojas, o las indicadas en 'hojas') en un solo DataFrame, con la
+    limpieza de tipos habitual. Ver leer_excel_por_bloques para el significado de los parámetros.
+    """
+    bloques = list(leer_excel_por_bloques(ruta, hojas, fechas=fechas, numericas=numericas, encabezado=encabezado,
+                                          columna_hoja=columna_hoja, montos=montos, motor=motor))
+    if not bloques:
+        return pd.DataFrame()
+    return pd.concat(bloques)
+
+
+def _huella_archivo(ruta):
+    """Calcula el SHA-256 del contenido de un archivo, leyéndolo por partes."""
+    huella = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for parte in iter(lambda: archivo.read(1024 * 1024), b''):
+            huella.update(parte)
+    return huella.hexdigest()
+
+
+def _cache_vigente(ruta, ruta_meta, opciones):
+    """
+    Indica si la cache de 'ruta' corresponde al archivo actual: misma fecha de modificación, o en su defecto el mismo
+    contenido (SHA-256), y las mismas opciones de limpieza.
+    """
+    try:
+        with open(ruta_meta) as archivo:
+            meta = json.load(archivo)
+    except (OSError, ValueError):
+        return False
+    if meta.get('opciones') != opciones:
+        return False
+
+    estado = os.stat(ruta)
+    if meta.get('mtime_ns') == estado.st_mtime_ns and meta.get('tamano') == estado.st_size:
+        return True
+    if meta.get('sha256') != _huella_archivo(ruta):
+        return False
+    # Mismo contenido con otra fecha de modificación: se actualiza la fecha guardada
+    _guardar_meta(ruta, ruta_meta, opciones, meta['sha256'])
+    return True
+
+
+def _guardar_meta(ruta, ruta_meta, opciones, sha256=None):
+    """Guarda junto a la cache la fecha de modificación, el tamaño y el SHA-256 del archivo original."""
+    estado = os.stat(ruta)
+    with open(ruta_meta, 'w') as archivo:
+        json.dump({'mtime_ns': estado.st_mtime_ns, 'tamano': estado.st_size,
+                   'sha256': sha256 or _huella_archivo(ruta), 'opciones': opciones}, archivo)
+
+
+@instrumentar()
+def leer_csv_cacheado(ruta, fechas=(), numericas=(), formato='parquet', **opciones_csv):
+    """
+    Lee un archivo CSV exportado (banco o cooperativa) con la limpieza de tipos habitual y guarda el DataFrame
+    resultante en formato columnar junto al CSV ('<ruta>.parquet' o '<ruta>.feather'). Mientras el CSV no cambie
+    (fecha de modificación o SHA-256), las siguientes lecturas cargan directamente el archivo columnar, mapeado en
+    memoria, sin volver a interpretar el texto.
+
+    Entradas:
+            ruta (str):        Ruta del archivo CSV, o de un libro de Excel (.xls, .xlsx), que se lee con leer_excel.
+            fechas (list):     Columnas de fecha, con el día primero (dayfirst).
+            numericas (list):  Columnas numéricas; los valores inválidos se convierten en 0.
+            formato (str):     'parquet' o 'feather' (sin compresión, se mapea en memoria sin copias).
+            **opciones_csv:    Opciones adicionales de pd.read_csv (o de leer_excel: hojas, encabezado, ...).
+
+    Devuelve:
+            pd.DataFrame con los datos limpios.
+
+    Raises:
+        ValueError: Si 'formato' no es 'parquet' ni 'feather'.
+
+    Si pyarrow no está instalado se lee siempre el CSV, sin cache.
+    """
+    if formato not in ('parquet', 'feather'):
+        raise ValueError(f"El formato de la cache debe ser 'parquet' o 'feather', pero se recibió: {formato}")
+
+    ruta_cache = f"{ruta}.{formato}"
+    ruta_meta  = f"{ruta_cache}.json"
+    opciones   = {'fechas': list(fechas), 'numericas': list(numericas), 'csv': repr(sorted(opciones_csv.items()))}
+
+    try:
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        pyarrow = None
+
+    if pyarrow is not None and os.path.exists(ruta_cache) and _cache_vigente(ruta, ruta_meta, opciones):
+        lector = pyarrow.parquet.read_table if formato == 'parquet' else pyarrow.feather.read_table
+        return lector(ruta_cache, memory_map=True).to_pandas()
+
+    if es_excel(ruta):
+        df = leer_excel(ruta, fechas=fechas, numericas=numericas, **opciones_csv)
+    else:
+        opciones_lectura = dict(dayfirst=True, decimal=".", thousands=',')
+        opciones_lectura.update(opciones_csv)
+        df = _limpiar_tipos(pd.read_csv(ruta, parse_dates=list(fechas), **opciones_lectura), fechas, numericas)
+
+    if pyarrow is not None:
+        try:
+            if formato == 'parquet':
+                df.to_parquet(ruta_cache, index=False)
+            else:
+                pyarrow.feather.write_feather(df, ruta_cache, compression='uncompressed')
+            _guardar_meta(ruta, ruta_meta, opciones)
+        except (OSError, ValueError, pyarrow.lib.ArrowException) as err:
+            print(f"No se pudo guardar la cache de {ruta}: {err}")
+    return df
+
+
+def leer_csv_por_bloques(ruta, tamano_bloque=100_000, fechas=(), numericas=(), **opciones_csv):
+    """
+    Versión por bloques de leer_csv_cacheado: devuelve el CSV limpio en bloques de 'tamano_bloque' filas.
+
+    La primera lectura interpreta el CSV bloque a bloque y escribe cada bloque limpio en '<ruta>.parquet'; las
+    siguientes leen los bloques del archivo Parquet. En ningún caso se carga el archivo completo en memoria.
+
+    Entradas:
+            ruta (str):          Ruta del archivo CSV, o de un libro de Excel (ver leer_excel_por_bloques).
+            tamano_bloque (int): Número de filas de cada bloque.
+            fechas, numericas, **opciones_csv: Igual que en leer_csv_cacheado.
+
+    Devuelve:
+            Generador de DataFrames, uno por bloque.
+    """
+    ruta_cache = f"{ruta}.parquet"
+    ruta_meta  = f"{ruta_cache}.json"
+    opciones   = {'fechas': list(fechas), 'numericas': list(numericas), 'csv': repr(sorted(opciones_csv.items()))}
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        pyarrow = None
+
+    if pyarrow is not None and os.path.exists(ruta_cache) and _cache_vigente(ruta, ruta_meta, opciones):
+        for lote in pyarrow.parquet.ParquetFile(ruta_cache, memory_map=True).iter_batches(batch_size=tamano_bloque):
+            yield lote.to_pandas()
+        return
+
+    if es_excel(ruta):
+        origen = leer_excel_por_bloques(ruta, tamano_bloque=tamano_bloque, **opciones_csv)
+    else:
+        opciones_lectura = dict(dayfirst=True, decimal=".", thousands=',')
+        opciones_lectura.update(opciones_csv)
+        origen = pd.read_csv(ruta, chunksize=tamano_bloque, parse_dates=list(fechas), **opciones_lectura)
+    # La cache se escribe en un archivo temporal y solo se activa si se llegan a leer todos los bloques
+    temporal, escritor = f"{ruta_cache}.tmp", None
+    try:
+        for bloque in origen:
+            bloque = _limpiar_tipos(bloque, fechas, numericas)
+            if pyarrow is not None:
+                try:
+                    tabla = pyarrow.Table.from_pandas(bloque, schema=escritor.schema if escritor else None,
+                                                      preserve_index=False)
+                    escritor = escritor or pyarrow.parquet.ParquetWriter(temporal, tabla.schema)
+                    escritor.write_table(tabla)
+                except (OSError, ValueError, pyarrow.lib.ArrowException) as err:
+                    # Tipos distintos entre bloques u otro error: se continúa sin cache
+                    print(f"No se pudo guardar la cache de {ruta}: {err}")
+                    pyarrow = None
+            yield bloque
+        if escritor is not None and pyarrow is not None:
+            escritor.close()
+            escritor = None
+            os.replace(temporal, ruta_cache)
+            _guardar_meta(ruta, ruta_meta, opciones)
+    finally:
+        if escritor is not None:
+            escritor.close()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
 
-def top_subcategories(df, category, top_n=5):
+def leer_bac_por_bloques(ruta, categories, desde=datetime(2016,1,1), tamano_bloque=100_000):
     """
-    Filtra y agrupa datos por subcategorías dentro de una categoría específica y devuelve las (top_n) más relevantes.
+    Lee el archivo CSV de movimientos bancarios (bac.csv) por bloques y prepara cada bloque por separado, de modo que
+    la memoria usada no depende del tamaño del archivo.
+
+    Para cada bloque se convierte la fecha una sola vez, se descartan las operaciones anteriores a 'desde', se
+    clasifican las transacciones y se agregan las columnas 'Categoria', 'Etiqueta', 'Año' y 'Mes'.
 
     Entradas:
-            df (pd.DataFrame): DataFrame que contiene los datos, ['Categoria', 'Etiqueta', 'Cargo'].
-            category (str)   : Categoría sobre la cual se agruparán los datos.
-            top_n (int)      : Número de subcategorías principales a devolver.
+            ruta (str):          Ruta del archivo CSV (o libro de Excel), con columnas 'Fecha_Tran', 'Transaccion',
+                                 'Cargo' y 'Abono'.
+            categories (dict):   Diccionario de categorías para clasificar transacciones.
+            desde (datetime):    Se conservan las operaciones posteriores a esta fecha.
+            tamano_bloque (int): Número de filas leídas en cada bloque.
 
     Devuelve:
-            pd.DataFrame     : DataFrame filtrado con las principales subcategorías de la categoría seleccionada.
+            Generador de DataFrames, uno por bloque.
+    """
+    compiladas = compilar_categorias(categories)
+    # Etiquetas comunes a todos los bloques; empiezan con las de las palabras clave y crecen con las nuevas
+    etiquetas  = sorted({keyword.split(':')[0] + ':' for keywords in categories.values() for keyword in keywords
+                         if ':' in keyword} | {'OTHER'})
 
-    Raises:
-        ValueError: Si el argumento `df` no es un DataFrame.
-        ValueError: Si el argumento `category` no es una cadena de texto.
-        ValueError: Si el argumento `top_n` no es un número entero positivo.
-        ValueError: Si el DataFrame no contiene las columnas requeridas: ['Categoria', 'Etiqueta', 'Cargo'].
-        ValueError: Si no se encuentran datos para la categoría especificada en el DataFrame.
+    # La fecha se convierte una sola vez (con errors="coerce" los valores inválidos quedan como NaT) y el resultado
+    # limpio queda en la cache Parquet de bac.csv para las siguientes ejecuciones
+    opciones   = {'montos': ['Cargo', 'Abono']} if es_excel(ruta) else {'dtype': {'Transaccion': str}}
+    for bloque in leer_csv_por_bloques(ruta, tamano_bloque, fechas=['Fecha_Tran'], **opciones):
+        bloque                   = bloque.loc[bloque['Fecha_Tran'] > desde].copy()
 
-    Ultima actualización:        8/4/2025          
-    Por:                 cemc (c)            
-    """
-    # Validar que 'df' sea un DataFrame
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError(f"El argumento 'df' debe ser un DataFrame, pero se recibió: {type(df)}")
-    
-    # Validar que 'category' sea una cadena de texto
-    if not isinstance(category, str):
-        raise ValueError(f"El argumento 'category' debe ser una cadena de texto, pero se recibió: {type(category)}")
-    
-    # Validar que 'top_n' sea un número entero positivo
-    if not isinstance(top_n, int) or top_n <= 0:
-        raise ValueError(f"El argumento 'top_n' debe ser un número entero positivo, pero se recibió: {top_n}")
-    
-    # Validar que las columnas requeridas existan en el DataFrame
-    required_columns = ['categoria', 'etiqueta', 'cargo']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"El DataFrame no contiene las columnas requeridas: {', '.join(missing_columns)}")
-    
-    # Filtrar datos por la categoría específica
-    filtered_df = df[df['categoria'] == category]
-    
-    # Validar que haya datos en la categoría filtrada
-    if filtered_df.empty:
-        raise ValueError(f"No se encontraron datos para la categoría: {category}")
-    
-    # Agrupar por etiquetas y calcular el total por subcategoría
-    subcategory_totals = filtered_df.groupby('etiqueta')['cargo'].sum()
-    
-    # Obtener las subcategorías principales
-    top_subcategories = subcategory_totals.nlargest(top_n).index
-    
-    # Devolver el DataFrame filtrado con las principales subcategorías
-    return filtered_df[filtered_df['etiqueta'].isin(top_subcategories)]
+        # Asegurar que no haya valores nulos en la columna "Transaccion" y convertir a mayusculas
+        bloque["Transaccion"]    = bloque["Transaccion"].fillna("").astype(str).str.upper()
+        bloque["Categoria"]      = clasificar_transacciones(bloque["Transaccion"], compiladas)
+        bloque['Etiqueta']       = extraer_etiquetas(bloque['Transaccion'], etiquetas)
+        etiquetas                = list(bloque['Etiqueta'].cat.categories)
+        bloque['Año']            = bloque['Fecha_Tran'].dt.year
+        bloque['Mes']            = bloque['Fecha_Tran'].dt.month
+        yield bloque
 
 
-def classify_transaction(transaction, categories):
+class CuboGastos:
     """
-    Función para clasificar transacciones. Se clasifican las transacciones de las operaciones bancarias en diferntes categorias. 
-    Devuelve: Se incrementa el dataframe en una columna, con la clasificacion de la transaccion.
-    
-    Descripción: Dado la dispersion de las transacciones se hace necesario agruparlas en categorias, mediante un diccionario. 
-    Ultima revision: 30/3/2025
+    Cubo de cargos y abonos agregados por (categoría, etiqueta, año, mes), construido con un solo groupby.
+
+    Las vistas que dibujan bac.py y bac_web.py (gastos por categoría, resumen anual, tablas Categoría x Año,
+    Etiqueta x Año y Año x Mes) se obtienen sumando filas del cubo, sin volver a recorrer los movimientos.
+    El cubo puede construirse de una vez (desde_movimientos) o por bloques (desde_bloques / agregar), y también
+    sobre un agregado ya calculado con menos niveles, p. ej. (categoría, año) de obtener_agregado_sql.
+
+    Atributos:
+        datos (pd.DataFrame): Una fila por combinación de claves con el cargo, el abono y el número de
+                              operaciones con cargo (columna '<cargo>_n', si se conoce).
+        claves (list):        Columnas de agrupación presentes en el cubo.
+        solo_cargos (bool):   Si las vistas de gastos usan solo las celdas con operaciones de cargo, como bac.py.
     """
 
-    # Validar que 'categories' sea un diccionario
-    if not isinstance(categories, dict):
-        raise ValueError(f"El argumento 'categories' debe ser un diccionario, pero se recibió: {type(categories)}")
-    
-    # Verificar que el diccionario no esté vacío
-    if not categories:
-        raise ValueError("El diccionario 'categories' está vacío, no se pueden realizar clasificaciones.")
-        
-    # Verificar que el argumento 'transaction' sea válido
-    if not isinstance(transaction, str):
-        raise ValueError(f"La transacción debe ser una cadena de texto, pero se recibió: {type(transaction)}")
-    
-    # Asegurar que 'transaction' no esté vacía
-    if not transaction.strip():
-        return "Otros gastos"
+    def __init__(self, datos=None, categoria='Categoria', etiqueta='Etiqueta', anio='Año', mes='Mes',
+                 cargo='Cargo', abono='Abono', solo_cargos=True):
+        self.categoria, self.etiqueta, self.anio, self.mes = categoria, etiqueta, anio, mes
+        self.cargo, self.abono, self.cargo_n = cargo, abono, f'{cargo}_n'
+        self.solo_cargos = solo_cargos
+        self.claves = [categoria, etiqueta, anio, mes]
+        self.datos = None
+        if datos is not None:
+            self.claves = [clave for clave in self.claves if clave in datos.columns]
+            self.datos = datos.reset_index(drop=True)
 
-    # Convertir la transacción a mayúsculas para evitar errores de comparación
-    transaction = transaction.upper()
+    @classmethod
+    def desde_movimientos(cls, df, excluir=(), **columnas):
+        """Construye el cubo a partir de movimientos (o de un agregado) en un solo groupby."""
+        cubo = cls(**columnas)
+        cubo.claves = [clave for clave in cubo.claves if clave in df.columns]
+        cubo.agregar(df, excluir)
+        return cubo
 
-    # Proceso de clasificación
-    for category, keywords in categories.items():
-        if any(keyword in transaction for keyword in keywords):
-            return category
-    
-    # Categoría por defecto si no hay coincidencias
-    return "Otros gastos"
+    @classmethod
+    def desde_bloques(cls, bloques, excluir=(), **columnas):
+        """Construye el cubo acumulando bloques de movimientos (ver leer_bac_por_bloques)."""
+        cubo = cls(**columnas)
+        for bloque in bloques:
+            cubo.agregar(bloque, excluir)
+        return cubo
 
-def extract_label(transaction):
-    """
-    Extrae una etiqueta de una transacción basada en su formato.
+    def agregar(self, df, excluir=()):
+        """Suma al cubo los movimientos de 'df', descartando las categorías de 'excluir'."""
+        df = df[~df[self.categoria].isin(excluir)]
+        # Cargo_n cuenta las operaciones con cargo, equivalente a filtrar Cargo.notna()
+        columnas = {self.cargo_n: df[self.cargo].notna()}
+        etiqueta = df[self.etiqueta] if self.etiqueta in self.claves else None
+        if etiqueta is not None and (not isinstance(etiqueta.dtype, pd.CategoricalDtype) or etiqueta.hasnans):
+            # Etiquetas vacías como 'nan', igual que con texto; las categóricas sin vacíos se agrupan por su código
+            columnas[self.etiqueta] = etiqueta.astype(str)
+        parcial = (df.assign(**columnas).groupby(self.claves, observed=True)[[self.cargo, self.abono, self.cargo_n]]
+                   .sum().reset_index())
+        if etiqueta is not None:
+            # Solo las etiquetas del agregado, pocas, pasan a texto
+            parcial[self.etiqueta] = parcial[self.etiqueta].astype(str)
+        # Las claves categóricas (ver normalizar_movimientos) se guardan como valores simples: el cubo es pequeño y
+        # así sus vistas se ordenan igual que con columnas de texto
+        parcial = parcial.astype({clave: object for clave in self.claves
+                                  if isinstance(parcial[clave].dtype, pd.CategoricalDtype)})
+        if self.datos is not None:
+            parcial = pd.concat([self.datos, parcial])
+        self.datos = parcial.groupby(self.claves).sum().reset_index()
+        return self
 
-    Args:
-        transaction (str): Descripción de la transacción.
+    def _gastos(self):
+        """Celdas del cubo que se usan en las vistas de gastos."""
+        if self.datos is None:
+            return pd.DataFrame(columns=self.claves + [self.cargo, self.abono, self.cargo_n])
+        if self.solo_cargos and self.cargo_n in self.datos.columns:
+            return self.datos[self.datos[self.cargo_n] > 0]
+        return self.datos
 
-    Returns:
-        str: Etiqueta extraída de la transacción o 'OTHER' si no se encuentra un formato esperado.
+    def gastos_por_categoria(self):
+        """Cargos por categoría, de mayor a menor."""
+        return self._gastos().groupby(self.categoria)[self.cargo].sum().sort_values(ascending=False)
+
+    def resumen_anual(self):
+        """DataFrame por año con los cargos y los abonos ('Ingresos')."""
+        resumen             = self._gastos().groupby(self.anio)[[self.cargo]].sum()
+        resumen['Ingresos'] = self.datos.groupby(self.anio)[self.abono].sum() if self.datos is not None else 0.0
+        return resumen
+
+    def calor_anual(self):
+        """Tabla pivote Categoría x Año de los cargos."""
+        return self._gastos().pivot_table(index=self.categoria, columns=self.anio, values=self.cargo,
+                                          aggfunc="sum", fill_value=0)
+
+    def calor_etiquetas(self, categoria, top_n=5):
+        """Tabla pivote Etiqueta x Año de las 'top_n' etiquetas con más cargos de 'categoria'."""
+        principales = top_subcategories(self._gastos(), categoria, top_n, columna_categoria=self.categoria,
+                                        columna_etiqueta=self.etiqueta, columna_valor=self.cargo)
+        return principales.pivot_table(index=self.etiqueta, columns=self.anio, values=self.cargo,
+                                       aggfunc="sum", fill_value=0)
+
+    def calor_mensual(self, categoria):
+        """Tabla pivote Año x Mes de los cargos de 'categoria'."""
+        gastos = self._gastos()
+        return gastos[gastos[self.categoria] == categoria].pivot_table(index=self.anio, columns=self.mes,
+                                                                       values=self.cargo, aggfunc="sum", fill_value=0)
+
+    def resumen(self, top_n=5):
+        """Todas las vistas de bac.py; ver resumen_bac."""
+        gastos      = self._gastos()
+        # Principales etiquetas de todas las categorías en una sola pasada
+        principales = top_subcategories_all(gastos, top_n, columna_categoria=self.categoria,
+                                            columna_etiqueta=self.etiqueta, columna_valor=self.cargo)
+        calor_etiquetas = {categoria: datos.pivot_table(index=self.etiqueta, columns=self.anio, values=self.cargo,
+                                                        aggfunc="sum", fill_value=0)
+                           for categoria, datos in principales.groupby(self.categoria, observed=True)}
+        calor_mensual   = {categoria: datos.pivot_table(index=self.anio, columns=self.mes, values=self.cargo,
+                                                        aggfunc="sum", fill_value=0)
+                           for categoria, datos in gastos.groupby(self.categoria, observed=True)}
+        return {
+            'gastos_por_categoria': self.gastos_por_categoria(),
+            'resumen_anual':        self.resumen_anual(),
+            'calor_anual':          self.calor_anual(),
+            'calor_etiquetas':      calor_etiquetas,
+            'calor_mensual':        calor_mensual,
+        }
+
+
+@instrumentar()
+def resumen_bac(bloques, excluir=("Otros gastos",), top_n=5):
     """
-    # Validar que 'transaction' sea una cadena de texto
-    if not isinstance(transaction, str):
-        raise ValueError(f"La transacción debe ser una cadena de texto, pero se recibió: {type(transaction)}")
+    Acumula los bloques de movimientos bancarios (ver leer_bac_por_bloques) en un CuboGastos por categoría,
+    etiqueta, año y mes, y a partir de él calcula los resúmenes que se dibujan en bac.py. Solo se guardan los
+    totales acumulados, nunca las filas de los bloques ya procesados.
 
-    # Asegurar que 'transaction' no esté vacía
-    if not transaction.strip():
-        return 'OTHER'
+    Entradas:
+            bloques:          Iterable de DataFrames con 'Categoria', 'Etiqueta', 'Año', 'Mes', 'Cargo' y 'Abono'.
+            excluir (tuple):  Categorías que se descartan (gastos aun no identificados).
+            top_n (int):      Número de etiquetas principales por categoría en 'calor_etiquetas'.
 
-    # Extraer etiqueta si existe el carácter ':'
-    if ':' in transaction:
-        return transaction.split(':')[0] + ':'
-    
-    # Etiqueta por defecto
-    return 'OTHER'
+    Devuelve:
+            dict con:
+                'gastos_por_categoria': Series de cargos por categoría, de mayor a menor.
+                'resumen_anual':        DataFrame por año con 'Cargo' e 'Ingresos' (abonos).
+                'calor_anual':          Tabla pivote Categoria x Año de los cargos.
+                'calor_etiquetas':      {categoria: tabla pivote Etiqueta x Año de sus 'top_n' etiquetas}.
+                'calor_mensual':        {categoria: tabla pivote Año x Mes de los cargos}.
+    """
+    return CuboGastos.desde_bloques(bloques, excluir).resumen(top_n)
 
 
 def cambiar_fecha(fecha):
     """
     Función para cambiar fecha. Se cambia la fecha de la última operación del año, 31/12 al primer día del siguiente 01/01.
-    fecha: Fecha de la última operacion de un año dado, 31/12. 
+    fecha: Fecha de la última operacion de un año dado, 31/12. También se acepta un DatetimeIndex completo,
+           en cuyo caso se cambian todas sus fechas 31/12 a la vez.
 
     Devuelve: cambio de fecha, 01/01.
     
@@ -212,11 +1641,23 @@ def cambiar_fecha(fecha):
     por las aportaciones a lo largo del año, incluyendo el saldo del año anterior. Sin embargo, para el cálculo del interés
     compuesto de la totalidad de la serie se requiere que ese 'abono' sea desplazado al 1 de enero del año siguiente. 
     """
+    if isinstance(fecha, pd.DatetimeIndex):
+        fin_de_anio = (fecha.month == 12) & (fecha.day == 31)
+        return fecha.where(~fin_de_anio, fecha + pd.Timedelta(days=1))
     if fecha.month == 12 and fecha.day == 31:
         return fecha + pd.DateOffset(days=1)
     return fecha
 
 
+def _es_numerico(valor):
+    """Indica si 'valor' es un número o un arreglo/Series de tipo numérico."""
+    if isinstance(valor, (int, float, np.number)):
+        return True
+    if isinstance(valor, (np.ndarray, pd.Series, pd.Index)):
+        return pd.api.types.is_numeric_dtype(valor.dtype)
+    return False
+
+
 def compound_interest(principal, rate, time):
     """
     Función para calcular el interés compuesto. 
@@ -225,9 +1666,11 @@ def compound_interest(principal, rate, time):
             principal:  Aportación realizada en una fecha dada al fondo, 'Abono'. 
             rate:       Tipo de interés. Se introduce en forma porcentual, para luego convertirlo en decimal (dividiendo por 100)
             time:       Unidad de tiempo. Pueden ser dias, meses o años.
+            Cada entrada puede ser un número, un arreglo de NumPy o una Series; el cálculo se hace en una sola
+            expresión vectorizada, principal * (1 + rate/100) ** time.
     
     Devuelve: 
-                        El interés compuesto de la entrada
+                        El interés compuesto de la entrada (número, arreglo o Series según las entradas)
     Raises:
             ValueError: Si los valores de principal o time son negativos.
             TypeError:  Si las entradas no son numéricas.
@@ -237,17 +1680,163 @@ def compound_interest(principal, rate, time):
     """
       
     # Validación de tipos
-    if not all(isinstance(x, (int, float)) for x in [principal, rate, time]):
+    if not all(_es_numerico(x) for x in [principal, rate, time]):
         raise TypeError("Los valores de principal, rate y time deben ser números.")
     
-    # Validación de valores negativos
-    if principal < 0:
+    # Validación de valores negativos, sobre todos los elementos a la vez
+    if np.any(np.asarray(principal) < 0):
         raise ValueError("El principal no puede ser negativo.")
-    if time < 0:
+    if np.any(np.asarray(time) < 0):
         raise ValueError("El tiempo no puede ser negativo.")
 
     # Cálculo del interés compuesto
-    return principal * (pow((1 + rate / 100), time))
+    return principal * (1 + rate / 100) ** time
+
+
+@instrumentar()
+def rendimientos_fondo(fs, intereses_anual, base_dias=360, base_interes=365):
+    """
+    Función para calcular, en una sola pasada agrupada, el rendimiento anual del Fondo Solidario con la fórmula
+    del interés compuesto y compararlo con el abonado por ACOFINGES.
+
+    Entradas:
+            fs:              DataFrame con índice de fechas y columnas 'Depósito' y 'Saldo', ya preparado: el saldo
+                             del 31/12 desplazado al 1/1 siguiente como 'Depósito' y la bonificación del año en 'Saldo'.
+            intereses_anual: Diccionario {año: interés anual (%)}.
+            base_dias:       Duración del año para el tiempo de cada depósito, tiempo = base_dias - día del año (360).
+            base_interes:    Días del año para convertir el interés anual en diario (365).
+
+    Devuelve:
+                    DataFrame 'compara', con índice 'Año' y columnas 'ACOFINGES' (bonificación abonada) y
+                    'CALCULADO' (suma de los rendimientos calculados entre el 1/1 y el 30/12 de cada año).
+    Raises:
+            TypeError:  Si 'fs' no es un DataFrame con índice DatetimeIndex.
+            ValueError: Si faltan las columnas 'Depósito' o 'Saldo' o el interés de algún ejercicio no está definido.
+    """
+
+    # Verificar que fs sea un DataFrame con índice de fechas
+    if not isinstance(fs, pd.DataFrame) or not isinstance(fs.index, pd.DatetimeIndex):
+        raise TypeError("El argumento 'fs' debe ser un DataFrame con índice de tipo DatetimeIndex.")
+
+    # Verificar que existan las columnas requeridas
+    if 'Depósito' not in fs.columns or 'Saldo' not in fs.columns:
+        raise ValueError("El DataFrame no contiene las columnas 'Depósito' y 'Saldo'.")
+
+    fechas                = fs.index
+    anio                  = fechas.year.to_numpy()
+
+    # Los 1/1 contienen la bonificación del año anterior abonada por ACOFINGES
+    inicio                = (fechas.month == 1) & (fechas.day == 1)
+    anios                 = anio[inicio] - 1
+
+    # Validar que el interés está definido para todos los ejercicios
+    for ejercicio in anios:
+        if intereses_anual.get(ejercicio) is None:
+            raise ValueError(f"El interés para el ejercicio {ejercicio} no está definido.")
+
+    # Filas de los ejercicios a comparar, excluyendo el 31 de diciembre
+    filas                 = np.isin(anio, anios) & ~((fechas.month == 12) & (fechas.day == 31))
+    deposito              = fs['Depósito'].to_numpy(dtype=float)[filas]
+    dias                  = base_dias - fechas.dayofyear.to_numpy()[filas]
+    interes               = pd.Series(anio[filas]).map(intereses_anual).to_numpy(dtype=float) / base_interes
+
+    # Interés compuesto de todas las filas en una sola expresión y suma por año
+    compuesto             = np.round(compound_interest(deposito, interes, dias), 2)
+    resultados            = pd.Series(compuesto - deposito).groupby(anio[filas]).sum().round(2)
+
+    compara               = pd.DataFrame({'Año': anios,
+                                          'ACOFINGES': fs['Saldo'].to_numpy()[inicio],
+                                          'CALCULADO': resultados.reindex(anios, fill_value=0.0).to_numpy()})
+    return compara.set_index('Año')
+
+
+def _repartir_en_procesos(funcion, argumentos, procesos=None):
+    """Ejecuta funcion(*args) para cada tupla de 'argumentos' en un pool de procesos y devuelve los resultados en orden."""
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return list(pool.map(funcion, *zip(*argumentos)))
+
+
+def _simular_bloque(saldo_inicial, intereses, depositos, meses_inicio, dias_saldo, dias_meses, base_interes):
+    """Resultado de la simulación para un bloque de intereses, arreglo (intereses, depósitos, meses de inicio)."""
+    tasa                  = intereses[:, None] / base_interes
+
+    # Rendimiento del saldo inicial, uno por interés
+    saldo                 = np.round(compound_interest(saldo_inicial, tasa[:, 0], dias_saldo), 2) - saldo_inicial
+
+    # Rendimiento de cada depósito mensual: (intereses, depósitos, 12 meses)
+    deposito              = depositos[None, :, None]
+    compuesto             = np.round(compound_interest(deposito, tasa[:, None, :], dias_meses[None, None, :]), 2) - deposito
+
+    # Cada mes de inicio suma los depósitos desde ese mes hasta diciembre
+    plan                  = (np.arange(1, 13)[None, :] >= meses_inicio[:, None]).astype(float)
+    return saldo[:, None, None] + np.einsum('iak,mk->iam', compuesto, plan)
+
+
+@instrumentar()
+def simular_escenarios(saldo_inicial, intereses, depositos, meses_inicio=(2,), anio=None, dia=25, fecha_inicial=None,
+                       base_dias=360, base_interes=365, procesos=None, max_celdas=5_000_000):
+    """
+    Función para simular la rentabilidad del Fondo Solidario durante un año para una rejilla de escenarios
+    (interés x depósito mensual x mes de inicio de los depósitos), en un solo cálculo vectorizado.
+
+    Entradas:
+            saldo_inicial: Saldo con el que se inicia el año (último dato del año anterior).
+            intereses:     Intereses anuales (%) a evaluar.
+            depositos:     Montos de los depósitos mensuales a evaluar.
+            meses_inicio:  Meses (1-12) en que empiezan los depósitos; se deposita cada mes hasta diciembre.
+            anio:          Año simulado. Por defecto el año de 'fecha_inicial'.
+            dia:           Día del mes en que se realiza cada depósito.
+            fecha_inicial: Fecha del saldo inicial. Por defecto el 1 de enero de 'anio'.
+            base_dias:     Duración del año para el tiempo de cada depósito, tiempo = base_dias - día del año (360).
+            base_interes:  Días del año para convertir el interés anual en diario (365).
+            procesos:      Número de procesos para rejillas grandes. None usa un pool solo si la rejilla supera
+                           'max_celdas' celdas; 1 desactiva el pool.
+            max_celdas:    Tamaño de la rejilla (intereses x depósitos x 12) a partir del cual se reparte en procesos.
+
+    Devuelve:
+                    DataFrame con una fila por escenario y columnas 'interes', 'deposito', 'mes_inicio',
+                    'aportacion' (total depositado en el año) y 'resultado' (rendimiento del año).
+    Raises:
+            ValueError: Si no se indica 'anio' ni 'fecha_inicial', o algún mes de inicio está fuera de 1-12.
+    """
+
+    intereses             = np.atleast_1d(np.asarray(intereses, dtype=float))
+    depositos             = np.atleast_1d(np.asarray(depositos, dtype=float))
+    meses_inicio          = np.atleast_1d(np.asarray(meses_inicio, dtype=int))
+
+    # Validar el año y los meses de inicio
+    if anio is None and fecha_inicial is None:
+        raise ValueError("Se debe indicar el año simulado ('anio') o la fecha del saldo inicial ('fecha_inicial').")
+    if np.any((meses_inicio < 1) | (meses_inicio > 12)):
+        raise ValueError("Los meses de inicio deben estar entre 1 y 12.")
+
+    fecha_inicial         = pd.Timestamp(anio, 1, 1) if fecha_inicial is None else pd.Timestamp(fecha_inicial)
+    anio                  = fecha_inicial.year if anio is None else anio
+
+    # Fechas de los depósitos, el mismo día de cada mes (o el último día si el mes es más corto)
+    meses                 = pd.DatetimeIndex([pd.Timestamp(anio, mes, 1) for mes in range(1, 13)])
+    fechas                = meses + pd.to_timedelta(np.minimum(dia, meses.days_in_month) - 1, unit='D')
+    dias_meses            = base_dias - fechas.dayofyear.to_numpy()
+    dias_saldo            = base_dias - fecha_inicial.dayofyear
+
+    # Rejillas grandes se reparten por bloques de intereses en un pool de procesos
+    celdas                = len(intereses) * len(depositos) * 12
+    if procesos is None:
+        procesos          = os.cpu_count() if celdas > max_celdas else 1
+    argumentos            = [(saldo_inicial, bloque, depositos, meses_inicio, dias_saldo, dias_meses, base_interes)
+                             for bloque in np.array_split(intereses, min(procesos, len(intereses)))]
+    if len(argumentos) > 1:
+        resultado         = np.concatenate(_repartir_en_procesos(_simular_bloque, argumentos, procesos))
+    else:
+        resultado         = _simular_bloque(*argumentos[0])
+
+    # Resultado en formato largo, una fila por escenario
+    interes, deposito, mes_inicio = np.meshgrid(intereses, depositos, meses_inicio, indexing='ij')
+    return pd.DataFrame({'interes': interes.ravel(),
+                         'deposito': deposito.ravel(),
+                         'mes_inicio': mes_inicio.ravel(),
+                         'aportacion': deposito.ravel() * (13 - mes_inicio.ravel()),
+                         'resultado': resultado.ravel().round(2)})
 
 
 def plot_barras(df, apilado=True, rotulos=['','','']):
@@ -258,6 +1847,8 @@ def plot_barras(df, apilado=True, rotulos=['','','']):
             stacked:   Se permite dibujar las barras contiguas o apiladas
             rotulos:   Se etiquetan los ejes y el título. 
     """
+    import matplotlib.pyplot as plt
+
     ax                = df.plot(kind='bar', stacked=apilado, rot=0)    
     ax.legend(loc='upper left')
     ax.set_xlabel(rotulos[0])
@@ -266,7 +1857,204 @@ def plot_barras(df, apilado=True, rotulos=['','','']):
     ax.grid()
     plt.show()
 
+
+MESES = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+
+def _dibujar_figura(tipo, datos, titulo, ruta):
+    """
+    Dibuja una figura del reporte de bac.py y la guarda en 'ruta' (el formato lo da la extensión).
+    Usa una Figure con el lienzo Agg, sin pyplot, de modo que no abre ventanas ni acumula figuras en el proceso.
+    """
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    tamanos = {'barras': (6.4, 4.8), 'categorias': (12, 3), 'pastel': (10, 6)}
+    fig = Figure(figsize=tamanos.get(tipo, (12, 4)))
+    FigureCanvasAgg(fig)
+    ax  = fig.add_subplot()
+
+    if tipo == 'barras':
+        datos.plot(kind='bar', stacked=False, rot=0, ax=ax)
+        ax.legend(loc='upper left')
+        ax.set_xlabel('Year')
+        ax.set_ylabel('US$')
+        ax.grid()
+    elif tipo == 'categorias':
+        sns.barplot(x=datos.values, y=datos.index, hue=datos.index, palette="viridis", ax=ax)
+        ax.grid()
+        ax.set_xlabel("Total Gastado ($)", fontsize=12)
+        ax.set_ylabel("Categoría", fontsize=12)
+        ax.tick_params(labelsize=10)
+    elif tipo == 'pastel':
+        datos.plot(kind="pie", autopct="%1.1f%%", startangle=140, cmap="tab10", ax=ax)
+        ax.set_ylabel("")
+    else:
+        sns.heatmap(datos, cmap="coolwarm", annot=True, fmt=".0f", linewidths=0.5, ax=ax)
+        if tipo == 'calor_mensual':
+            ax.set_xlabel("Mes")
+            ax.set_ylabel("Año")
+            ax.set_xticks(np.arange(len(datos.columns)) + 0.5, [MESES[mes - 1] for mes in datos.columns])
+        else:
+            ax.set_xlabel("Año")
+            ax.set_ylabel("Categoría" if tipo == 'calor_anual' else "")
+            ax.tick_params(axis='x', labelrotation=45)
+        ax.tick_params(axis='y', labelrotation=0)
+    ax.set_title(titulo)
+
+    fig.savefig(ruta, bbox_inches='tight')
+    fig.clear()
+    return ruta
+
+
+def figuras_bac(resumen):
+    """
+    Lista de las figuras del reporte de bac.py a partir de resumen_bac(), como tuplas (nombre, tipo, datos, título).
+    Todas las tablas pivote ya vienen calculadas en 'resumen', de modo que dibujar no recorre los movimientos.
+    """
+    figuras = [('ingresos_gastos', 'barras', resumen['resumen_anual'], 'Ingresos vs Gastos'),
+               ('gastos_categoria', 'categorias', resumen['gastos_por_categoria'], "Distribución de Gastos por Categoría"),
+               ('gastos_categoria_pastel', 'pastel', resumen['gastos_por_categoria'], "Distribución de Gastos por Categoría"),
+               ('gastos_categoria_anio', 'calor_anual', resumen['calor_anual'], "Gastos por Categoría y Año")]
+    for categoria, datos in resumen['calor_etiquetas'].items():
+        figuras.append((f"etiquetas_{categoria}", 'calor_etiquetas', datos, f"Gastos: {categoria}"))
+    for categoria, datos in resumen['calor_mensual'].items():
+        figuras.append((f"mensual_{categoria}", 'calor_mensual', datos, f"Gastos: {categoria}"))
+    return figuras
+
+
+@instrumentar()
+def generar_reporte_bac(resumen, directorio, formato='png', procesos=None):
+    """
+    Genera sin pantalla (backend Agg) todas las figuras de bac.py y las guarda como archivos en 'directorio'.
+    Las figuras se dibujan en paralelo en un pool de procesos, una tarea por figura.
+
+    Entradas:
+            resumen:    Resultado de resumen_bac().
+            directorio: Directorio de salida; se crea si no existe.
+            formato:    'png' o 'svg'.
+            procesos:   Número de procesos (None usa todos los núcleos; 1 dibuja en este proceso).
+
+    Devuelve:
+            list: Rutas de los archivos generados, en el orden de figuras_bac().
+    Raises:
+            ValueError: Si el formato no es 'png' ni 'svg'.
+    """
+    if formato not in ('png', 'svg'):
+        raise ValueError(f"Formato no soportado: {formato}. Use 'png' o 'svg'.")
+    os.makedirs(directorio, exist_ok=True)
+
+    # Nombres de archivo sin espacios ni '/', p. ej. 'mensual_Supermercado_hogar.png'
+    argumentos = [(tipo, datos, titulo, os.path.join(directorio, re.sub(r'\W+', '_', nombre).strip('_') + '.' + formato))
+                  for nombre, tipo, datos, titulo in figuras_bac(resumen)]
+    if procesos == 1:
+        return [_dibujar_figura(*args) for args in argumentos]
+    return _repartir_en_procesos(_dibujar_figura, argumentos, procesos)
+
   
+def huella_datos(datos):
+    """
+    Calcula una huella (hash) del contenido de un DataFrame o Series, incluyendo índice y nombres de columnas.
+    Dos agregados con los mismos datos producen la misma huella, lo que permite reutilizar sus gráficos.
+
+    Entradas:
+            datos:  DataFrame o Series a identificar.
+    Devuelve:
+            str:    Huella hexadecimal SHA-1.
+    """
+    huella = hashlib.sha1()
+    nombres = datos.columns.tolist() if isinstance(datos, pd.DataFrame) else [datos.name]
+    huella.update(repr((nombres, datos.index.names)).encode())
+    huella.update(pd.util.hash_pandas_object(datos, index=True).to_numpy().tobytes())
+    return huella.hexdigest()
+
+
+def serializar_tabla(datos, formato='json'):
+    """
+    Serializa un agregado (DataFrame o Series) en formato columnar, con el índice como primera(s) columna(s), para
+    que un cliente lo dibuje sin pedir una imagen al servidor.
+
+    Entradas:
+            datos:    DataFrame o Series agregado (p. ej. gastos_ingresos o una tabla pivote).
+            formato:  'json' -> {"columnas": [nombres], "datos": [[valores de cada columna]]}, con null para NaN.
+                      'arrow' -> flujo Arrow IPC (requiere pyarrow).
+    Devuelve:
+            bytes:    Contenido serializado.
+    Raises:
+            ValueError:  Si el formato no es 'json' ni 'arrow'.
+            ImportError: Si se pide 'arrow' y pyarrow no está instalado.
+    """
+    df = datos.to_frame() if isinstance(datos, pd.Series) else datos
+    # El índice se descarta si no tiene nombre o ya está como columna (gastos_ingresos tiene 'año' en ambos)
+    sin_indice = all(nombre is None or nombre in df.columns for nombre in df.index.names)
+    df = df.reset_index(drop=sin_indice)
+    # Las columnas de las tablas pivote son años (enteros): los nombres se pasan a texto
+    df.columns = [str(columna) for columna in df.columns]
+
+    if formato == 'json':
+        columnas = [df[columna].astype(object).where(df[columna].notna(), None).tolist() for columna in df.columns]
+        return json.dumps({"columnas": list(df.columns), "datos": columnas}, ensure_ascii=False,
+                          separators=(',', ':'), default=str).encode('utf-8')
+    if formato == 'arrow':
+        import pyarrow
+        import pyarrow.ipc
+        tabla = pyarrow.Table.from_pandas(df, preserve_index=False)
+        salida = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(salida, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+        return salida.getvalue().to_pybytes()
+    raise ValueError(f"Formato no soportado: {formato}. Use 'json' o 'arrow'.")
+
+
+class CacheGraficos:
+    """
+    Cache LRU de gráficos ya dibujados (bytes PNG), con límite de elementos y de memoria.
+
+    Las claves se forman con el tipo de gráfico y la huella del agregado que se dibuja (ver huella_datos), de modo que
+    un gráfico solo se vuelve a dibujar cuando cambian sus datos. Al superar 'max_bytes' o 'max_elementos' se
+    descartan los gráficos usados hace más tiempo.
+
+    Parámetros:
+        max_bytes (int): Memoria máxima ocupada por los gráficos guardados.
+        max_elementos (int): Número máximo de gráficos guardados.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_elementos=128):
+        self.max_bytes = max_bytes
+        self.max_elementos = max_elementos
+        self.bytes = 0
+        self._graficos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        """Devuelve los bytes guardados para 'clave', o None si no están en la cache."""
+        with self._lock:
+            contenido = self._graficos.get(clave)
+            if contenido is not None:
+                self._graficos.move_to_end(clave)
+            return contenido
+
+    def guardar(self, clave, contenido):
+        """Guarda 'contenido' (bytes) y descarta los gráficos más antiguos si se superan los límites."""
+        if len(contenido) > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._graficos:
+                self.bytes -= len(self._graficos.pop(clave))
+            self._graficos[clave] = contenido
+            self.bytes += len(contenido)
+            while self.bytes > self.max_bytes or len(self._graficos) > self.max_elementos:
+                _, antiguo = self._graficos.popitem(last=False)
+                self.bytes -= len(antiguo)
+
+    def limpiar(self):
+        """Elimina todos los gráficos guardados."""
+        with self._lock:
+            self._graficos.clear()
+            self.bytes = 0
+
+
 def ejercicio_anual_1(datos, interes):
     """
     Función para calcular el interés compuesto de un único ejercicio fiscal (anual). 
@@ -292,14 +2080,15 @@ def ejercicio_anual_1(datos, interes):
     if interes is None:
         raise ValueError(f"El interés para el ejercicio {datos.index.year[0]} no está definido.")
 
-    # Aplicar la función fila por fila
-    datos['compuesto'] = datos.apply(lambda row: compound_interest(row['Depósito'], interes, row['time']), axis=1).round(2)
+    # Aplicar la función sobre la columna completa
+    datos['compuesto'] = compound_interest(datos['Depósito'], interes, datos['time']).round(2)
     
     # Agregar resultados
     datos['resultado'] = datos['compuesto'] - datos['Depósito']
     return datos
 
 
+@instrumentar()
 def ejercicio_anual(datos, interes):
     """
     Función para calcular el interés compuesto de un único ejercicio fiscal (anual). 
@@ -353,7 +2142,7 @@ def ejercicio_anual(datos, interes):
         raise ValueError(f"El interés para el ejercicio {datos.index.year[0]} no está definido.")
 
     # Aplicar la función de interés compuesto
-    datos['compuesto'] = datos.apply(lambda row: compound_interest(row['Depósito'], interes, row['time']), axis=1).round(2)
+    datos['compuesto'] = compound_interest(datos['Depósito'], interes, datos['time']).round(2)
     
     # Agregar resultados
     datos['resultado'] = datos['compuesto'] - datos['Depósito']
@@ -395,3 +2184,277 @@ def filtrar_enero(grupo):
     return grupo
     
 
+
+def filtrar_enero_vectorizado(df, cuenta=None):
+    """
+    Versión vectorizada de groupby(año).apply(filtrar_enero): conserva solo la última operación de enero de cada
+    año (y de cada cuenta si se indica 'cuenta') sobre todo el DataFrame a la vez, con una máscara 'duplicated' y un
+    único ordenamiento, sin llamar a una función de Python por grupo.
+
+    Entradas:
+            df:      DataFrame con la columna 'Fecha' (datetime), de una o varias cuentas.
+            cuenta:  Nombre de la columna que identifica la cuenta (None si el DataFrame es de una sola cuenta).
+
+    Devuelve:
+                    El DataFrame sin las operaciones de enero anteriores a la última de cada año (y cuenta),
+                    ordenado por fecha (por cuenta y fecha si se indica 'cuenta'). Conserva el índice original.
+    Raises:
+            TypeError:  Si 'df' no es un DataFrame o 'Fecha' no es de tipo datetime.
+            ValueError: Si falta la columna 'Fecha' o la columna de la cuenta.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("El argumento 'df' debe ser un DataFrame de pandas.")
+    if 'Fecha' not in df.columns:
+        raise ValueError("El DataFrame no contiene la columna 'Fecha'.")
+    if cuenta is not None and cuenta not in df.columns:
+        raise ValueError(f"El DataFrame no contiene la columna '{cuenta}'.")
+    if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        raise TypeError("La columna 'Fecha' debe ser de tipo datetime.")
+
+    # Llave (cuenta, año) de las operaciones de enero; 'duplicated' marca todas menos la última de cada llave,
+    # igual que enero.iloc[[-1]] en filtrar_enero (el orden dentro del grupo es el orden original de las filas)
+    enero  = df['Fecha'].dt.month.to_numpy() == 1
+    llave  = pd.DataFrame({'año': df['Fecha'].dt.year.to_numpy()[enero]})
+    if cuenta is not None:
+        llave.insert(0, 'cuenta', df[cuenta].to_numpy()[enero])
+    sobra  = np.zeros(len(df), dtype=bool)
+    sobra[np.flatnonzero(enero)] = llave.duplicated(keep='last').to_numpy()
+
+    orden  = ['Fecha'] if cuenta is None else [cuenta, 'Fecha']
+    return df[~sobra].sort_values(orden, kind='stable')
+
+
+class LibroFondo:
+    """
+    Libro persistente de una cuenta de la cooperativa (aportaciones), con los totales anuales y mensuales ya
+    calculados y la fecha del último movimiento procesado.
+
+    agregar() solo procesa los movimientos que aún no están en el libro (los de fechas posteriores a 'ultima_fecha'
+    y, de esa misma fecha, los que no se habían procesado) y actualiza únicamente los meses y años afectados, de
+    modo que ingresar el estado de cuenta de cada día, aunque se descargue dos veces, no obliga a recalcular toda la
+    historia. Los movimientos con fecha anterior a 'ultima_fecha' se ignoran: para corregirlos se reconstruye el libro.
+    Los totales mensuales siguen el tratamiento de acofinges_APO.py: en enero solo cuenta la última operación del
+    mes y su depósito es el saldo (que incluye el saldo del año anterior); el resto de meses suma sus depósitos.
+
+    Atributos:
+        deposito_anual (pd.Series):   Suma de depósitos por año.
+        saldo_anual (pd.Series):      Último saldo de cada año.
+        deposito_mensual (pd.Series): Depósito de cada (año, mes) para el cálculo del interés compuesto.
+        ultima_fecha (pd.Timestamp):  Fecha del último movimiento procesado.
+        cuenta:                       Cuenta del libro; si se indica, agregar() solo toma las filas de esa cuenta
+                                      (columna 'cuenta') y cargar() comprueba que el libro guardado sea de ella.
+    """
+
+    def __init__(self, cuenta=None):
+        self.cuenta = cuenta
+        # Depósito y saldo de los movimientos ya procesados de 'ultima_fecha'
+        self._ultimo_dia = pd.DataFrame({'Depósito': pd.Series(dtype=float), 'Saldo': pd.Series(dtype=float)})
+        self.deposito_anual = pd.Series(dtype=float)
+        self.saldo_anual = pd.Series(dtype=float)
+        self.deposito_mensual = pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], []], names=['año', 'mes']))
+        self.ultima_fecha = None
+        self._resultados = {}
+
+    def agregar(self, movimientos):
+        """
+        Incorpora los movimientos nuevos (columnas 'Fecha', 'Depósito' y 'Saldo'). De 'ultima_fecha' se descartan
+        los ya procesados, identificados por depósito y saldo (la n-ésima repetición de un mismo par solo es nueva
+        si el libro tiene menos de n).
+
+        Devuelve:
+            int: Número de movimientos procesados.
+        """
+        if self.cuenta is not None and 'cuenta' in movimientos.columns:
+            movimientos = movimientos[movimientos['cuenta'] == self.cuenta]
+        nuevos = movimientos[['Fecha', 'Depósito', 'Saldo']]
+        if self.ultima_fecha is not None:
+            nuevos    = nuevos[nuevos['Fecha'] >= self.ultima_fecha]
+            mismo_dia = (nuevos['Fecha'] == self.ultima_fecha).to_numpy()
+            if mismo_dia.any():
+                claves   = ['Depósito', 'Saldo']
+                dia      = nuevos[mismo_dia]
+                vistos   = self._ultimo_dia.groupby(claves).size().rename('vistos').reset_index()
+                vistos   = dia[claves].merge(vistos, on=claves, how='left')['vistos'].fillna(0).to_numpy()
+                repetido = np.zeros(len(nuevos), dtype=bool)
+                repetido[np.flatnonzero(mismo_dia)] = dia.groupby(claves).cumcount().to_numpy() < vistos
+                nuevos   = nuevos[~repetido]
+        if nuevos.empty:
+            return 0
+        nuevos = nuevos.sort_values('Fecha', kind='stable').reset_index(drop=True)
+        anio   = nuevos['Fecha'].dt.year
+
+        # Totales anuales: se suman los depósitos y el saldo es el último del año
+        self.deposito_anual = self.deposito_anual.add(nuevos.groupby(anio)['Depósito'].sum(), fill_value=0)
+        saldo               = nuevos.groupby(anio)['Saldo'].last()
+        self.saldo_anual    = saldo.combine_first(self.saldo_anual).sort_index()
+        self.deposito_anual.index.name = self.saldo_anual.index.name = 'año'
+
+        # Totales mensuales: última operación de enero con el saldo como depósito y suma del resto de meses
+        colapsado = filtrar_enero_vectorizado(nuevos).reset_index(drop=True)
+        ene       = colapsado['Fecha'].dt.month == 1
+        colapsado.loc[ene, 'Depósito'] = colapsado.loc[ene, 'Saldo']
+        mensual   = colapsado.groupby([colapsado['Fecha'].dt.year.rename('año'),
+                                       colapsado['Fecha'].dt.month.rename('mes')])['Depósito'].sum()
+        enero     = mensual.index.get_level_values('mes') == 1
+        # Un enero nuevo reemplaza al anterior del mismo año; los demás meses se acumulan
+        actual    = self.deposito_mensual.add(mensual.where(~enero, 0), fill_value=0)
+        actual.loc[mensual.index[enero]] = mensual[enero]
+        self.deposito_mensual = actual.sort_index()
+
+        ultima            = nuevos['Fecha'].iloc[-1]
+        dia               = nuevos.loc[nuevos['Fecha'] == ultima, ['Depósito', 'Saldo']]
+        self._ultimo_dia  = pd.concat([self._ultimo_dia, dia], ignore_index=True) if ultima == self.ultima_fecha \
+            else dia
+        self.ultima_fecha = ultima
+        for ejercicio in anio.unique():
+            self._resultados.pop(ejercicio, None)
+        return len(nuevos)
+
+    def ejercicio(self, anio, interes):
+        """
+        Calcula el interés compuesto del ejercicio 'anio' con ejercicio_anual, una fila por mes. Un año sin
+        movimientos da un resultado vacío, como ejercicio_anual con un DataFrame vacío.
+        """
+        meses = self.deposito_mensual[self.deposito_mensual.index.get_level_values('año') == anio].droplevel('año')
+        datos = pd.DataFrame({'Depósito': meses.to_numpy()},
+                             index=pd.DatetimeIndex([pd.Timestamp(anio, mes, 1) for mes in meses.index])
+                             + pd.offsets.MonthEnd(0))
+        return ejercicio_anual(datos, interes)
+
+    def resultados(self, intereses_anual):
+        """
+        Resultado de cada ejercicio con interés definido en 'intereses_anual' (interés anual, se aplica mensual /12).
+        Los ejercicios que no cambiaron desde la última llamada no se recalculan.
+
+        Devuelve:
+            pd.DataFrame con índice 'año' y columnas 'Saldo', 'interes' y 'resultado'.
+        """
+        filas = []
+        for anio in self.deposito_mensual.index.get_level_values('año').unique():
+            interes = intereses_anual.get(anio)
+            if interes is None:
+                continue
+            if self._resultados.get(anio, (None,))[0] != interes:
+                datos = self.ejercicio(anio, interes / 12)
+                self._resultados[anio] = (interes, datos['Depósito'].sum(), datos['resultado'].sum().round(2))
+            filas.append((anio,) + self._resultados[anio])
+        return pd.DataFrame(filas, columns=['año', 'interes', 'Saldo', 'resultado']).set_index('año')
+
+    def guardar(self, ruta):
+        """Guarda el libro en disco."""
+        pd.to_pickle(self.__dict__, ruta)
+
+    @classmethod
+    def cargar(cls, ruta, cuenta=None):
+        """
+        Carga un libro guardado con guardar(), o crea uno vacío si 'ruta' no existe.
+
+        Raises:
+            ValueError: Si el libro guardado es de otra cuenta.
+        """
+        libro = cls(cuenta)
+        if os.path.exists(ruta):
+            guardado = pd.read_pickle(ruta)
+            if cuenta is not None and guardado.get('cuenta') not in (None, cuenta):
+                raise ValueError(f"El libro {ruta} es de la cuenta {guardado['cuenta']}, no de {cuenta}.")
+            libro.__dict__.update(guardado)
+            libro.cuenta = cuenta if cuenta is not None else libro.cuenta
+        return libro
+
+
+def _tabla_intereses(intereses_anual, cuenta):
+    """Normaliza la tabla de intereses a un DataFrame con columnas 'año' e 'interes' (y la cuenta si se indica)."""
+    if isinstance(intereses_anual, pd.DataFrame):
+        tabla = intereses_anual.copy()
+    else:
+        tabla = pd.Series(intereses_anual, dtype=float).rename_axis('año').rename('interes').reset_index()
+    columnas = ['año', 'interes'] + ([cuenta] if cuenta in tabla.columns else [])
+    faltan = set(columnas[:2]) - set(tabla.columns)
+    if faltan:
+        raise ValueError(f"La tabla de intereses no contiene las columnas {sorted(faltan)}.")
+    return tabla[columnas].astype({'año': int, 'interes': float})
+
+
+def _resultados_apo_bloque(movimientos, intereses, cuenta):
+    """Resultado por cuenta y año de un bloque de cuentas; ver resultados_apo."""
+    # Última operación de enero de cada cuenta y año (por fecha), con el saldo como depósito
+    datos     = movimientos[[cuenta, 'Fecha', 'Depósito', 'Saldo']].sort_values([cuenta, 'Fecha'], kind='stable')
+    datos     = filtrar_enero_vectorizado(datos, cuenta)
+    ene       = datos['Fecha'].dt.month == 1
+    deposito  = datos['Depósito'].where(~ene, datos['Saldo'])
+
+    # Depósito de cada mes, en formato largo (cuenta, año, mes)
+    mensual   = deposito.groupby([datos[cuenta], datos['Fecha'].dt.year.rename('año'),
+                                  datos['Fecha'].dt.month.rename('mes')], observed=True).sum().reset_index()
+
+    # Interés compuesto mensual de todos los meses a la vez, como ejercicio_anual (tiempo = 13 - mes)
+    llaves    = ['año'] + ([cuenta] if cuenta in intereses.columns else [])
+    mensual   = mensual.merge(intereses, on=llaves, how='left')
+    compuesto = compound_interest(mensual['Depósito'], mensual['interes'] / 12, 13 - mensual['mes']).round(2)
+    mensual['resultado'] = compuesto - mensual['Depósito']
+
+    # Sumas nativas de groupby; min_count=1 deja NaN el resultado de los años sin interés definido
+    grupos    = mensual.groupby([cuenta, 'año'], observed=True)
+    resumen   = grupos.agg(interes=('interes', 'first'), Saldo=('Depósito', 'sum'))
+    resumen['resultado'] = grupos['resultado'].sum(min_count=1).round(2)
+    return resumen
+
+
+@instrumentar()
+def resultados_apo(movimientos, intereses_anual, cuenta='cuenta', procesos=1):
+    """
+    Función para calcular, en un solo cálculo agrupado, el resultado del ejercicio de aportaciones (acofinges_APO.py)
+    de todas las cuentas y todos los años de un DataFrame en formato largo.
+
+    Entradas:
+            movimientos:     DataFrame con las columnas de la cuenta, 'Fecha' (datetime), 'Depósito' y 'Saldo'.
+            intereses_anual: Interés anual (%) por año: diccionario o Series {año: interes}, o DataFrame con
+                             columnas 'año' e 'interes' (y la columna de la cuenta para intereses por cuenta).
+                             Se aplica mensual (/12), igual que en acofinges_APO.py.
+            cuenta:          Nombre de la columna que identifica la cuenta.
+            procesos:        Número de procesos entre los que se reparten las cuentas (1 calcula en este proceso).
+
+    Devuelve:
+                    DataFrame con índice (cuenta, 'año') y columnas 'interes', 'Saldo' (suma de los depósitos
+                    mensuales del ejercicio) y 'resultado'. Los años sin interés definido quedan con NaN.
+    Raises:
+            ValueError: Si faltan columnas en 'movimientos' o en la tabla de intereses.
+    """
+    faltan = {cuenta, 'Fecha', 'Depósito', 'Saldo'} - set(movimientos.columns)
+    if faltan:
+        raise ValueError(f"El DataFrame no contiene las columnas {sorted(faltan)}.")
+    intereses = _tabla_intereses(intereses_anual, cuenta)
+
+    # Las cuentas se reparten en bloques completos: cada cuenta queda en un solo proceso
+    procesos  = max(1, min(procesos or os.cpu_count(), movimientos[cuenta].nunique()))
+    if procesos == 1:
+        return _resultados_apo_bloque(movimientos, intereses, cuenta)
+    bloque    = pd.factorize(movimientos[cuenta])[0] % procesos
+    argumentos = [(movimientos[bloque == i], intereses, cuenta) for i in range(procesos)]
+    return pd.concat(_repartir_en_procesos(_resultados_apo_bloque, argumentos, procesos)).sort_index()
+
+
+def __getattr__(nombre):
+    """
+    Carga bajo demanda las dependencias pesadas que antes se importaban al cargar el módulo, para que
+    'finanzas.plt', 'finanzas.sns', 'finanzas.Flask', etc. sigan funcionando sin penalizar el arranque.
+    """
+    if nombre == 'plt':
+        import matplotlib.pyplot as valor
+    elif nombre == 'sns':
+        import seaborn as valor
+    elif nombre == 'scipy':
+        import scipy.stats
+        valor = scipy
+    elif nombre == 'xlrd':
+        import xlrd as valor
+    elif nombre == 'mysql':
+        import mysql.connector
+        valor = mysql
+    elif nombre in ('Flask', 'render_template', 'request'):
+        import flask
+        valor = getattr(flask, nombre)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    globals()[nombre] = valor
+    return valor
@@ -3,9 +3,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import datetime as dt
+from finanzas import leer_csv_cacheado
 
 main_dir       = '/home/carlos/workbenchPython/finanzas/datos/'
-df             = pd.read_csv(main_dir+'cotiza.csv', parse_dates=['Fecha'], dayfirst=True)  
+df             = leer_csv_cacheado(main_dir+'cotiza.csv', fechas=['Fecha'], thousands=None)
 
 # Set index
 df.set_index('Fecha', inplace = True)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Pruebas de los cálculos de aportaciones (acofinges_APO.py) en una sola pasada: filtrar_enero_vectorizado da las
+# mismas filas que groupby().apply(filtrar_enero) y resultados_apo el mismo resultado que ejercicio_anual aplicado
+# a cada cuenta y año.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+INTERESES = {2016: 6.0, 2017: 5.5, 2018: 4.42}
+
+# groupby().apply() sobre las columnas de agrupación avisa de un cambio futuro de pandas
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning", "ignore::FutureWarning")
+
+
+def aportaciones(cuentas=4, n=600, semilla=0):
+    """Aportaciones de varias cuentas, con varias operaciones en enero y algunas fechas repetidas."""
+    rng = np.random.default_rng(semilla)
+    partes = []
+    for cuenta in range(cuentas):
+        fechas = pd.Timestamp('2016-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365, n)), unit='D')
+        deposito = rng.integers(10, 200, n).astype(float)
+        partes.append(pd.DataFrame({'cuenta': cuenta, 'Fecha': fechas, 'Depósito': deposito,
+                                    'Saldo': 1000.0 * cuenta + deposito.cumsum()}))
+    # Filas de las cuentas mezcladas, como en un estado de cuenta combinado
+    return (pd.concat(partes, ignore_index=True).sample(frac=1, random_state=0)
+            .sort_values('Fecha', kind='stable'))
+
+
+def test_filtrar_enero_una_cuenta():
+    ap = aportaciones(cuentas=1)
+    esperado = ap.groupby(ap['Fecha'].dt.year).apply(finanzas.filtrar_enero).reset_index(level=0, drop=True)
+    vectorizado = finanzas.filtrar_enero_vectorizado(ap)
+    assert vectorizado['Fecha'].is_monotonic_increasing
+    # El orden de las filas de una misma fecha no está definido en filtrar_enero (sort_values inestable)
+    pd.testing.assert_frame_equal(vectorizado.sort_index(), esperado.sort_index())
+
+
+def test_filtrar_enero_por_cuenta():
+    ap = aportaciones()
+    esperado = (ap.groupby(['cuenta', ap['Fecha'].dt.year]).apply(finanzas.filtrar_enero)
+                .reset_index(level=[0, 1], drop=True))
+    vectorizado = finanzas.filtrar_enero_vectorizado(ap, 'cuenta')
+    pd.testing.assert_frame_equal(vectorizado.sort_index(), esperado.sort_index())
+    assert (vectorizado['Fecha'].dt.month == 1).groupby([vectorizado['cuenta'],
+                                                        vectorizado['Fecha'].dt.year]).sum().max() == 1
+
+
+def ejercicios_por_cuenta(ap, intereses):
+    """Cálculo de acofinges_APO.py, una cuenta y un ejercicio a la vez."""
+    filas = []
+    for cuenta, datos in ap.groupby('cuenta'):
+        datos = datos.drop(columns='cuenta')
+        datos = datos.groupby(datos['Fecha'].dt.year).apply(finanzas.filtrar_enero).reset_index(drop=True)
+        ene = datos['Fecha'].dt.month == 1
+        datos.loc[ene, 'Depósito'] = datos.loc[ene, 'Saldo']
+        mensual = datos.set_index('Fecha').groupby(pd.Grouper(freq=pd.offsets.MonthEnd())).sum()
+        for anio, interes in intereses.items():
+            ejercicio = finanzas.ejercicio_anual(mensual[mensual.index.year == anio], interes / 12)
+            filas.append((cuenta, anio, interes, ejercicio['Depósito'].sum(), ejercicio['resultado'].sum().round(2)))
+    return pd.DataFrame(filas, columns=['cuenta', 'año', 'interes', 'Saldo', 'resultado']).set_index(['cuenta', 'año'])
+
+
+@pytest.mark.parametrize("procesos", [1, 2])
+def test_resultados_apo_igual_que_ejercicio_anual(procesos):
+    ap = aportaciones()
+    esperado = ejercicios_por_cuenta(ap, INTERESES)
+    resultado = finanzas.resultados_apo(ap, INTERESES, procesos=procesos)
+    pd.testing.assert_frame_equal(resultado.loc[esperado.index], esperado, check_dtype=False,
+                                  check_index_type=False)
+
+
+def test_resultados_apo_sin_interes():
+    ap = aportaciones(cuentas=1)
+    resultado = finanzas.resultados_apo(ap, {2016: 6.0})
+    assert resultado.loc[(0, 2017), 'resultado'] != resultado.loc[(0, 2017), 'resultado']   # NaN
+    assert resultado.loc[(0, 2016), 'resultado'] == ejercicios_por_cuenta(ap, {2016: 6.0}).loc[(0, 2016), 'resultado']
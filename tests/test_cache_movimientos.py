@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Pruebas de CacheMovimientos (cache de bac_web.py) sobre SQLite: las actualizaciones incrementales ven las filas
+# nuevas del mismo día y las insertadas después con fechas ya cargadas.
+#
+# Uso:   python -m pytest tests
+import os
+import sqlite3
+import sys
+from functools import partial
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+CATEGORIAS = {"Supermercado/hogar": ["SELECTOS:"], "Ingresos": ["UES:"], "Otros gastos": []}
+CONSULTA = "SELECT id, fecha_tran, transaccion, cargo, abono FROM movimientos"
+
+
+@pytest.fixture
+def conexion(tmp_path):
+    """Fábrica de conexiones a una base SQLite con la tabla de movimientos y tres filas."""
+    obtener = partial(sqlite3.connect, str(tmp_path / "movimientos.db"))
+    with obtener() as bd:
+        bd.execute("CREATE TABLE movimientos (id INTEGER PRIMARY KEY, fecha_tran TEXT, transaccion TEXT, "
+                   "cargo REAL, abono REAL)")
+    insertar(obtener, ("2024-01-10", "SELECTOS: A", 10.0, None),
+                      ("2024-01-10", "SELECTOS: A", 10.0, None),
+                      ("2024-01-11", "UES: SALARIO", None, 500.0))
+    return obtener
+
+
+def insertar(conexion, *filas):
+    with conexion() as bd:
+        bd.executemany("INSERT INTO movimientos (fecha_tran, transaccion, cargo, abono) VALUES (?, ?, ?, ?)", filas)
+
+
+def filas_en_tabla(conexion):
+    with conexion() as bd:
+        return bd.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0]
+
+
+def cache(conexion, columna_id, consulta=CONSULTA):
+    return finanzas.CacheMovimientos(conexion, consulta, CATEGORIAS, ttl=0, marcador='?', excluir=(),
+                                     columna_id=columna_id)
+
+
+@pytest.mark.parametrize("columna_id", ["id", None])
+def test_filas_del_mismo_dia(conexion, columna_id):
+    datos = cache(conexion, columna_id)
+    assert len(datos.obtener()) == 3
+
+    insertar(conexion, ("2024-01-11", "SELECTOS: B", 7.5, None), ("2024-01-12", "SELECTOS: C", 2.0, None))
+    assert len(datos.obtener()) == filas_en_tabla(conexion) == 5
+    # Otra fila de la última fecha, ya con la cache actualizada
+    insertar(conexion, ("2024-01-12", "SELECTOS: C", 2.0, None))
+    assert len(datos.obtener()) == 6
+    version = datos.version
+    # Sin cambios en la base de datos no cambia la versión servida
+    assert len(datos.obtener()) == 6 and datos.version == version
+
+
+def test_filas_con_fecha_anterior(conexion):
+    datos = cache(conexion, "id")
+    datos.obtener()
+    insertar(conexion, ("2024-01-12", "SELECTOS: C", 2.0, None))
+    datos.obtener()
+    # Movimiento tardío de una fecha ya cargada
+    insertar(conexion, ("2024-01-10", "SELECTOS: D", 4.0, None))
+    servidos = datos.obtener()
+    assert len(servidos) == filas_en_tabla(conexion) == 5
+    assert servidos['cargo'].sum() == pytest.approx(26.0)
+    assert servidos['categoria'].value_counts()["Supermercado/hogar"] == 4
+
+
+def test_igual_que_recargar(conexion):
+    datos = cache(conexion, None)
+    datos.obtener()
+    insertar(conexion, ("2024-01-11", "UES: BONO", None, 50.0), ("2024-01-13", "SELECTOS: E", 1.0, None))
+    incremental = datos.obtener().sort_values('id', ignore_index=True)
+    completo = cache(conexion, None).obtener().sort_values('id', ignore_index=True)
+    assert incremental.equals(completo)
+
+
+def test_error_en_la_carga_completa(conexion):
+    datos = cache(conexion, None, "SELECT * FROM no_existe")
+    with pytest.raises(Exception):
+        datos.obtener()
+
+
+def test_error_en_la_actualizacion(conexion):
+    # Si falla una actualización incremental se siguen sirviendo los datos anteriores
+    datos = cache(conexion, "id")
+    anteriores = datos.obtener()
+    with conexion() as bd:
+        bd.execute("ALTER TABLE movimientos RENAME TO otra")
+    assert datos.obtener() is anteriores
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Pruebas de la carga de movimientos (cargar_movimientos) sobre SQLite.
+#
+# Uso:   python -m pytest tests
+import os
+import sqlite3
+import sys
+from functools import partial
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+CATEGORIAS = {"Supermercado/hogar": ["SELECTOS:"], "Ingresos": ["UES:"], "Otros gastos": []}
+
+
+def movimientos(*filas):
+    """DataFrame de movimientos (fecha_tran, transaccion, cargo, abono)."""
+    return pd.DataFrame(list(filas), columns=finanzas.COLUMNAS_MOVIMIENTOS)
+
+
+@pytest.fixture
+def conexion(tmp_path):
+    """Fábrica de conexiones a una base SQLite nueva."""
+    return partial(sqlite3.connect, str(tmp_path / "movimientos.db"))
+
+
+def cargar(conexion, df):
+    return finanzas.cargar_movimientos(conexion, df, dialecto='sqlite', tamano_lote=2)
+
+
+def filas_en_tabla(conexion):
+    with conexion() as bd:
+        return bd.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0]
+
+
+PRIMERO = movimientos(("2024-01-10", "SELECTOS: A", 10.0, None),
+                      ("2024-01-10", "SELECTOS: A", 10.0, None),   # dos compras idénticas el mismo día
+                      ("2024-01-11", "UES: SALARIO", None, 500.0))
+
+
+def test_cargar_dos_veces_no_inserta(conexion):
+    assert cargar(conexion, PRIMERO)['insertadas'] == 3
+    resultado = cargar(conexion, PRIMERO)
+    assert (resultado['insertadas'], resultado['duplicadas']) == (0, 3)
+    assert resultado['insertadas_por_segundo'] == 0
+    assert filas_en_tabla(conexion) == 3
+
+
+def test_exportaciones_solapadas(conexion):
+    cargar(conexion, PRIMERO)
+    # Segunda exportación: repite el 11/01 y trae una compra más ese día y otra el 12/01
+    segundo = movimientos(("2024-01-11", "UES: SALARIO", None, 500.0),
+                          ("2024-01-11", "SELECTOS: B", 7.5, None),
+                          ("2024-01-12", "SELECTOS: A", 10.0, None))
+    resultado = cargar(conexion, segundo)
+    assert (resultado['insertadas'], resultado['duplicadas']) == (2, 1)
+    # Un tercer archivo con la compra repetida del 10/01 tres veces: solo la tercera es nueva
+    tercero = movimientos(*[("2024-01-10", "SELECTOS: A", 10.0, None)] * 3)
+    assert cargar(conexion, tercero)['insertadas'] == 1
+    assert filas_en_tabla(conexion) == 6
+
+
+def test_indices_del_tablero(conexion):
+    cargar(conexion, PRIMERO)
+    with conexion() as bd:
+        indices = {nombre for nombre, in bd.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_movimientos_fecha', 'idx_movimientos_anio'} <= indices
+
+
+def test_tabla_existente_sin_id(conexion):
+    # Tabla creada antes del cargador: la carga no cambia sus columnas y la migración no es posible en SQLite
+    with conexion() as bd:
+        bd.execute("CREATE TABLE movimientos (fecha_tran TEXT, transaccion TEXT, cargo REAL, abono REAL)")
+    assert cargar(conexion, PRIMERO)['insertadas'] == 3
+    bd = conexion()
+    try:
+        assert finanzas.columnas_tabla(bd, dialecto='sqlite') == set(finanzas.COLUMNAS_MOVIMIENTOS)
+        with pytest.raises(ValueError):
+            finanzas.migrar_tabla_movimientos(bd, dialecto='sqlite')
+    finally:
+        bd.close()
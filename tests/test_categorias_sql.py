@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Pruebas de categorias_sql y consulta_agregada sobre SQLite: la clasificación en la base de datos coincide con
+# classify_transaction y el agregado por año y categoría con el calculado en pandas.
+#
+# Uso:   python -m pytest tests
+import os
+import sqlite3
+import sys
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+CATEGORIAS = {
+    "Supermercado/hogar": ["SELECTOS:", "SUPER:"],
+    "Restaurantes/Entreten.": ["RST:", "100%_BAR:"],
+    "Retiro de cajeros": ["RETIRO NAC.:"],
+    "Ingresos": ["UES:", "O'HARA:"],
+    "Otros gastos": [],
+}
+
+# Sin minúsculas con acento: UPPER() de SQLite solo convierte letras ASCII (ver DIALECTOS_SQL)
+TRANSACCIONES = ["SELECTOS: A", "selectos: b", "RST: SUPER: C", "100%_BAR: D", "100X_BAR: E", "RETIRO NAC.: F",
+                 "UES: G", "O'HARA: H", "CAFÉ: I", "", "   ", "\t\n", None, "SIN CATEGORIA"]
+
+
+@pytest.fixture
+def bd(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({'fecha_tran': pd.Timestamp('2015-06-01') + pd.to_timedelta(rng.integers(0, 3000, n), unit='D'),
+                       'transaccion': rng.choice(np.array(TRANSACCIONES, dtype=object), n),
+                       'cargo': rng.integers(1, 10_000, n) / 100,
+                       'abono': np.where(rng.random(n) < 0.3, rng.integers(1, 10_000, n) / 100, np.nan)})
+    df['fecha_tran'] = df['fecha_tran'].dt.strftime('%Y-%m-%d')
+    obtener = partial(sqlite3.connect, str(tmp_path / "movimientos.db"))
+    with obtener() as conexion:
+        df.to_sql('movimientos', conexion, index=False)
+    return obtener, df
+
+
+def test_categorias_sql_igual_que_classify_transaction(bd):
+    obtener, df = bd
+    with obtener() as conexion:
+        sql = pd.read_sql(f"SELECT {finanzas.categorias_sql(CATEGORIAS, dialecto='sqlite')} AS categoria "
+                          "FROM movimientos ORDER BY rowid", conexion)['categoria']
+    esperado = df['transaccion'].fillna('').apply(finanzas.classify_transaction, args=(CATEGORIAS,))
+    assert sql.tolist() == esperado.tolist()
+
+
+def test_consulta_agregada_igual_que_pandas(bd):
+    obtener, df = bd
+    sql = finanzas.obtener_agregado_sql(obtener, CATEGORIAS, dialecto='sqlite')
+
+    df = df.assign(año=pd.to_datetime(df['fecha_tran']).dt.year,
+                   categoria=finanzas.clasificar_transacciones(df['transaccion'].fillna(''), CATEGORIAS))
+    df = df[(df['año'] >= 2016) & (df['categoria'] != "Otros gastos")]
+    esperado = df.groupby(['año', 'categoria'], as_index=False)[['cargo', 'abono']].sum()
+
+    orden = ['año', 'categoria']
+    pd.testing.assert_frame_equal(sql.sort_values(orden, ignore_index=True),
+                                  esperado.sort_values(orden, ignore_index=True), check_dtype=False)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Pruebas de clasificar_transacciones: las mismas categorías que classify_transaction fila por fila.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+# Como en bac.py, con palabras clave que se solapan entre categorías y caracteres especiales de las expresiones
+# regulares ('.', '-')
+CATEGORIAS = {
+    "Supermercado/hogar": ["SELECTOS:", "SUPER:", "HOGAR:"],
+    "Restaurantes/Entreten.": ["RST:", "CINE:"],
+    "Ropa y accesorios": ["ROPA-ZAP:"],
+    "Retiro de cajeros": ["RETIRO NAC.:", "RETIRO INT.:"],
+    "Ingresos": ["UES:", "SUPER"],
+    "Otros gastos": [],
+}
+
+TRANSACCIONES = ["SELECTOS: COLONIA", "selectos: minúsculas", "RST: SUPER: CENA", "CINE:", "ROPA-ZAP: TIENDA",
+                 "ROPAXZAP: NO", "RETIRO NAC.: CAJERO", "RETIRO NACX: NO", "UES: SALARIO", "SUPERMERCADO",
+                 "TRANSF.: OTRA", "", "   ", "\t\n", "CAFÉ: ÁRBOL", "SIN DOS PUNTOS"]
+
+
+def test_igual_que_classify_transaction():
+    rng = np.random.default_rng(0)
+    transacciones = pd.Series(rng.choice(TRANSACCIONES, 5000), index=rng.permutation(5000), name='Transaccion')
+
+    esperado = transacciones.apply(finanzas.classify_transaction, args=(CATEGORIAS,))
+    pd.testing.assert_series_equal(finanzas.clasificar_transacciones(transacciones, CATEGORIAS), esperado)
+    # También con las categorías ya compiladas
+    compiladas = finanzas.compilar_categorias(CATEGORIAS)
+    pd.testing.assert_series_equal(finanzas.clasificar_transacciones(transacciones, compiladas), esperado)
+
+
+def test_vacia():
+    assert finanzas.clasificar_transacciones(pd.Series([], dtype=object), CATEGORIAS).empty
+
+
+@pytest.mark.parametrize("valor", [None, np.nan, 12])
+def test_no_texto(valor):
+    with pytest.raises(ValueError):
+        finanzas.clasificar_transacciones(pd.Series(["UES: SALARIO", valor]), CATEGORIAS)
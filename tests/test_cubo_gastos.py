@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Pruebas de CuboGastos: el cubo de etiquetas categóricas es el mismo que el de etiquetas de texto.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+
+def movimientos(n=5000, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'Categoria': rng.choice(['Supermercado/hogar', 'Ingresos', 'Otros gastos'], n),
+        'Etiqueta':  rng.choice(['SELECTOS:', 'SUPER:', 'UES:', 'OTHER'], n),
+        'Año':       rng.integers(2016, 2025, n),
+        'Mes':       rng.integers(1, 13, n),
+        'Cargo':     np.where(rng.random(n) < 0.7, rng.integers(1, 10_000, n) / 100, np.nan),
+        'Abono':     np.where(rng.random(n) < 0.3, rng.integers(1, 10_000, n) / 100, np.nan),
+    })
+
+
+@pytest.mark.parametrize("vacias", [False, True])
+def test_etiquetas_categoricas(vacias):
+    texto = movimientos()
+    if vacias:
+        texto.loc[::97, 'Etiqueta'] = np.nan
+    categorica = texto.assign(Etiqueta=texto['Etiqueta'].astype('category'))
+
+    esperado = finanzas.CuboGastos.desde_movimientos(texto, excluir=("Otros gastos",))
+    cubo = finanzas.CuboGastos.desde_bloques(np.array_split(categorica, 3), excluir=("Otros gastos",))
+    pd.testing.assert_frame_equal(cubo.datos, esperado.datos)
+    assert all(isinstance(etiqueta, str) for etiqueta in cubo.datos['Etiqueta'])
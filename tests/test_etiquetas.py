@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Pruebas de extraer_etiquetas: las mismas etiquetas que extract_label fila por fila.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+TRANSACCIONES = ["SELECTOS: COLONIA", "RST: SUPER: CENA", ":SIN ETIQUETA", "UES:", "SIN DOS PUNTOS", "", "   ",
+                 "RETIRO NAC.: CAJERO", "café: árbol"]
+
+
+def test_igual_que_extract_label():
+    rng = np.random.default_rng(0)
+    transacciones = pd.Series(rng.choice(TRANSACCIONES, 3000), index=rng.permutation(3000))
+
+    esperado = transacciones.apply(finanzas.extract_label)
+    etiquetas = finanzas.extraer_etiquetas(transacciones)
+    assert list(etiquetas) == esperado.tolist()
+    assert list(etiquetas.categories) == sorted(esperado.unique())
+
+
+def test_categorias_fijas_entre_bloques():
+    bloques = [pd.Series(["UES: A", "SELECTOS: B"]), pd.Series(["NUEVA: C", "sin etiqueta"])]
+    categorias = ["SELECTOS:", "UES:", "OTHER"]
+    primero = finanzas.extraer_etiquetas(bloques[0], categorias)
+    segundo = finanzas.extraer_etiquetas(bloques[1], list(primero.categories))
+    assert list(primero.categories) == categorias
+    # Las nuevas se añaden al final: los códigos del primer bloque valen igual en el segundo
+    assert list(segundo.categories) == categorias + ["NUEVA:"]
+    assert list(primero) + list(segundo) == ["UES:", "SELECTOS:", "NUEVA:", "OTHER"]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Pruebas de la lectura de estados de cuenta desde libros de Excel: mismos montos que el CSV equivalente.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+openpyxl = pytest.importorskip("openpyxl")
+
+FILAS = [("01/02/2024", "SELECTOS: A", "1,200.50", None),
+         ("02/02/2024", "UES: SALARIO", None, 2500),
+         ("03/02/2024", "UES: SALARIO", 12.25, "3,000"),
+         ("04/02/2024", "SELECTOS: B", "N/D", None)]
+COLUMNAS = ["Fecha_Tran", "Transaccion", "Cargo", "Abono"]
+
+
+@pytest.fixture
+def libro(tmp_path):
+    ruta = str(tmp_path / "bac.xlsx")
+    wb = openpyxl.Workbook()
+    wb.active.append(COLUMNAS)
+    for fila in FILAS:
+        wb.active.append(fila)
+    wb.save(ruta)
+    return ruta
+
+
+def test_montos_con_separador_de_miles(libro, tmp_path, capsys):
+    ruta_csv = str(tmp_path / "bac.csv")
+    pd.DataFrame(FILAS, columns=COLUMNAS).to_csv(ruta_csv, index=False)
+    csv = pd.read_csv(ruta_csv, thousands=',')
+
+    excel = finanzas.leer_excel(libro, fechas=["Fecha_Tran"], montos=["Cargo", "Abono"])
+    assert excel["Cargo"].dtype == excel["Abono"].dtype == "float64"
+    assert excel["Cargo"].tolist()[:3] == pytest.approx([1200.5, float("nan"), 12.25], nan_ok=True)
+    assert excel["Abono"].sum() == pytest.approx(csv["Abono"].sum()) == pytest.approx(5500.0)
+    # El monto ilegible se informa en lugar de desaparecer sin aviso
+    assert pd.isna(excel["Cargo"].iloc[3])
+    assert "Cargo: 1 valores no numéricos" in capsys.readouterr().out
+
+
+def test_numericas_en_cero(libro):
+    excel = finanzas.leer_excel(libro, numericas=["Cargo", "Abono"])
+    assert excel["Cargo"].tolist() == [1200.5, 0.0, 12.25, 0.0]
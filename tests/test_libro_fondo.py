@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Pruebas de LibroFondo: las actualizaciones incrementales (por partes, con estados de cuenta solapados o repetidos)
+# dan los mismos totales que reconstruir el libro con todos los movimientos.
+#
+# Uso:   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finanzas
+
+
+def aportaciones(n=1529, semilla=0):
+    """Aportaciones con varias operaciones por día, como acofingesAPO.csv."""
+    rng = np.random.default_rng(semilla)
+    fechas = pd.Timestamp('2016-01-02') + pd.to_timedelta(np.sort(rng.integers(0, 900, n)), unit='D')
+    ap = pd.DataFrame({'Fecha': fechas, 'Depósito': rng.integers(10, 200, n).astype(float)})
+    ap['Saldo'] = ap['Depósito'].cumsum()
+    return ap
+
+
+def igual_a_reconstruir(libro, ap):
+    completo = finanzas.LibroFondo()
+    completo.agregar(ap)
+    for atributo in ('deposito_anual', 'saldo_anual', 'deposito_mensual'):
+        pd.testing.assert_series_equal(getattr(libro, atributo), getattr(completo, atributo), check_dtype=False)
+
+
+def test_libro_estado_descargado_dos_veces():
+    ap = aportaciones()
+    libro = finanzas.LibroFondo()
+    procesados = libro.agregar(ap.iloc[:500]) + libro.agregar(ap)
+    assert procesados == len(ap)
+    assert libro.agregar(ap) == 0
+    igual_a_reconstruir(libro, ap)
+
+
+@pytest.mark.parametrize("partes", [2, 7, 50])
+def test_libro_por_partes(partes):
+    ap = aportaciones()
+    libro = finanzas.LibroFondo()
+    assert sum(libro.agregar(parte) for parte in np.array_split(ap, partes)) == len(ap)
+    igual_a_reconstruir(libro, ap)
+
+
+def test_libro_de_otra_cuenta(tmp_path):
+    ap = aportaciones().assign(cuenta=lambda df: np.arange(len(df)) % 2)
+    libro = finanzas.LibroFondo(cuenta=1)
+    assert libro.agregar(ap) == (ap['cuenta'] == 1).sum()
+    ruta = str(tmp_path / 'libro.pkl')
+    libro.guardar(ruta)
+    with pytest.raises(ValueError):
+        finanzas.LibroFondo.cargar(ruta, cuenta=0)
+
+
+def test_ejercicio_sin_movimientos():
+    libro = finanzas.LibroFondo()
+    libro.agregar(aportaciones())
+    assert libro.ejercicio(2030, 0.5).empty
+    assert not libro.ejercicio(2016, 0.5).empty